@@ -0,0 +1,211 @@
+# Computer controlled poker players.
+# Decisions are pure functions of the table state, so they run in worker processes.
+
+import json
+import time
+import argparse
+from enum import Enum
+from random import Random
+from collections import namedtuple
+from addons import holdem
+from addons.holdem import Action, EventType, GameStatus, PlayerStatus
+from addons.deuces.evaluator import Evaluator
+from addons.deuces.preflop import PreflopTable
+from addons.deuces.equity import remaining_cards
+
+# CPU seconds per decision, equity noise, share of the bank to bet and how often to bluff
+Profile = namedtuple("Profile", ["budget", "noise", "aggression", "bluff"])
+
+# Everything a decision needs, taken from the table when it's AI's turn
+Situation = namedtuple("Situation", ["hand", "board", "opponents", "bank", "balance", "current_stake",
+                                     "highest_stake", "big_blind", "actions"])
+
+
+class Difficulty(Enum):
+    EASY = Profile(budget=0.002, noise=0.15, aggression=0.3, bluff=0.02)
+    MEDIUM = Profile(budget=0.01, noise=0.06, aggression=0.5, bluff=0.05)
+    HARD = Profile(budget=0.03, noise=0.0, aggression=0.75, bluff=0.08)
+
+
+class AIUser:
+    """
+    Stands in for Discord member in AI seats. It has no account,
+    so its chips come with it and never reach database.
+    """
+
+    __slots__ = ("id", "name", "difficulty")
+
+    def __init__(self, number, difficulty: Difficulty):
+        self.id = "ai-{}".format(number)
+        self.name = "Bot {} ({})".format(number, difficulty.name.lower())
+        self.difficulty = difficulty
+
+    @property
+    def mention(self):
+        return "**{}**".format(self.name)
+
+    def __str__(self):
+        return self.name
+
+
+# Evaluator of the worker process
+_evaluator = None
+
+
+def estimate_equity(hand, board, opponents, budget, rng):
+    """
+    Share of the pot hand wins against random opponents' hands,
+    simulated until budget of CPU seconds is spent.
+    """
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = Evaluator(Evaluator.DIRECT)
+    evaluate = _evaluator.evaluate
+
+    remaining = remaining_cards(hand, board)
+    missing = 5 - len(board)
+    needed = missing + 2 * opponents
+
+    total = 0.0
+    simulations = 0
+    deadline = time.process_time() + budget
+
+    # Clock is read once per batch, it costs as much as a few evaluations
+    while simulations == 0 or time.process_time() < deadline:
+        for _ in range(16):
+            cards = rng.sample(remaining, needed)
+            runout = board + cards[:missing]
+
+            rank = evaluate(hand, runout)
+            ties = 1
+            for i in range(missing, needed, 2):
+                opponent_rank = evaluate(cards[i:i + 2], runout)
+                if opponent_rank < rank:
+                    break
+                elif opponent_rank == rank:
+                    ties += 1
+            else:
+                total += 1.0 / ties
+
+        simulations += 16
+
+    return total / simulations
+
+
+def decide(situation: Situation, difficulty: Difficulty, seed, budget=None):
+    """
+    Returns (Action, amount) for the situation. Runs in worker processes.
+    Budget overrides CPU seconds of the difficulty.
+    """
+    # All-in players only wait for the showdown
+    if situation.balance == 0:
+        return Action.CHECK, 0
+
+    profile = difficulty.value
+    rng = Random(seed)
+    actions = situation.actions
+    opponents = max(situation.opponents, 1)
+
+    if not situation.board:
+        # Preflop equities are precomputed
+        players = min(opponents + 1, PreflopTable.MAX_PLAYERS)
+        equity = PreflopTable.equity(situation.hand[0], situation.hand[1], players)
+    else:
+        budget = profile.budget if budget is None else budget
+        equity = estimate_equity(list(situation.hand), list(situation.board), opponents, budget, rng)
+
+    # Weaker players misjudge their hands
+    equity = min(max(equity + rng.gauss(0.0, profile.noise), 0.0), 1.0) if profile.noise else equity
+
+    to_call = situation.highest_stake - situation.current_stake
+    pot_odds = to_call / (situation.bank + to_call) if to_call else 0.0
+    # Equity of an average hand against this many opponents
+    fair_share = 1.0 / (opponents + 1)
+    strong = equity > fair_share * (1.5 + opponents * 0.1) or rng.random() < profile.bluff
+
+    bet = max(int(situation.bank * profile.aggression), situation.big_blind)
+
+    if Action.BET in actions and strong:
+        return Action.BET, min(bet, situation.balance)
+    elif Action.RAISE in actions and strong:
+        # Raise is ON the amount, it has to fit into balance with the current stake
+        amount = min(bet, situation.balance + situation.current_stake - situation.highest_stake)
+        if amount > 0:
+            return Action.RAISE, amount
+
+    if to_call <= 0:
+        return (Action.CHECK if Action.CHECK in actions else Action.CALL), 0
+    elif equity < pot_odds:
+        return Action.FOLD, 0
+    elif Action.CALL in actions:
+        return Action.CALL, 0
+    elif Action.ALLIN in actions and equity > fair_share:
+        return Action.ALLIN, 0
+
+    return Action.FOLD, 0
+
+
+def situation(game: holdem.Game, player):
+    return Situation(tuple(player.hand), tuple(game.table.cards), len(game.table.rotation) - 1, game.table.bank,
+                     player.balance, player.current_stake, game.round_highest_stake, game.big_blind,
+                     tuple(game.get_available_actions(player)))
+
+
+def benchmark(hands_count, players_count, difficulty: Difficulty, seed, budget=None):
+    """
+    Plays hands at a table of AI seats only, decisions are made in this process.
+    """
+    rng = Random(seed)
+    game = holdem.Game(seed)
+    players = [game.add_player(AIUser(i, difficulty), 10000) for i in range(players_count)]
+
+    hands = 0
+    decisions = 0
+    decision_time = 0.0
+
+    start = time.perf_counter()
+    while hands < hands_count:
+        # Broke seats buy in again, so the table keeps playing
+        for player in players:
+            if player.balance < game.MIN_BALANCE:
+                player.balance = 10000
+
+        game.start_hand()
+        while game.status is not GameStatus.PENDING:
+            player = next(player for player in game.players if player.status is PlayerStatus.THONKING)
+
+            decision_start = time.perf_counter()
+            action, amount = decide(situation(game, player), difficulty, rng.getrandbits(64), budget)
+            decision_time += time.perf_counter() - decision_start
+            decisions += 1
+
+            events = game.act(player, action, amount)
+            if any(event.type is EventType.REJECTED for event in events):
+                raise RuntimeError("Rejected {} {} of {}".format(action.name, amount, player))
+
+        hands += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "hands": hands,
+        "players": players_count,
+        "difficulty": difficulty.name,
+        "hands_per_second": hands / elapsed,
+        "decisions_per_second": decisions / elapsed,
+        "mean_decision_ms": 1000 * decision_time / decisions if decisions else None,
+        "engine_share": 1.0 - decision_time / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays hands between AI seats to benchmark the poker engine")
+    parser.add_argument("--hands", type=int, default=200, help="hands to play")
+    parser.add_argument("--players", type=int, default=6, help="AI seats at the table")
+    parser.add_argument("--difficulty", choices=[difficulty.name.lower() for difficulty in Difficulty], default="easy")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the table and decisions")
+    parser.add_argument("--budget", type=float, help="CPU seconds per decision instead of the difficulty's, 0 measures the engine")
+    args = parser.parse_args()
+
+    result = benchmark(args.hands, args.players, Difficulty[args.difficulty.upper()], args.seed, args.budget)
+
+    print(json.dumps(result, indent=4))
@@ -0,0 +1,139 @@
+import os
+import queue
+import asyncio
+import sqlite3
+import threading
+from urllib.parse import quote
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Database:
+    """
+    Asynchronous gateway to the bot's sqlite database.
+
+    All writes go through a single writer thread and its queue, so they
+    never run concurrently and never block the event loop. Reads are
+    served by a small pool of read-only connections. Database is in WAL
+    mode, so readers see every committed write and don't wait for the writer.
+
+    Commits aren't synced to disk, only checkpoints are. They survive a crash
+    of the bot, but the last ones might be lost with the whole system, writers
+    who can't afford that keep a journal of their own and checkpoint().
+    """
+
+    def __init__(self, path, readers=2):
+        self.path = path
+        self.local = threading.local()
+
+        self.writer = sqlite3.connect(path, check_same_thread=False)
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        self.writer.execute("PRAGMA synchronous=NORMAL")
+
+        self.queue = queue.Queue()
+        self.writer_thread = threading.Thread(target=self.writer_loop, name="db-writer", daemon=True)
+        self.writer_thread.start()
+
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+
+    # Writer thread
+    def writer_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+
+            future, func, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = func(self.writer, *args)
+                self.writer.commit()
+            except BaseException as e:
+                self.writer.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        self.writer.close()
+
+    def submit(self, func, *args):
+        """
+        Queues func(connection, *args) to run in a transaction in the writer thread.
+        Returns concurrent.futures.Future.
+        """
+        future = Future()
+        self.queue.put((future, func, args))
+        return future
+
+    @staticmethod
+    def checkpoint(db):
+        """
+        Copies committed writes from WAL into database file and syncs it.
+        Returns False if readers kept some of them in WAL.
+        Has to run in the writer thread, outside of a transaction.
+        """
+        busy, log, checkpointed = db.execute("PRAGMA wal_checkpoint(FULL)").fetchone()
+        return not busy and log == checkpointed
+
+    # Reader threads
+    def reader(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            uri = "file:{}?mode=ro".format(quote(os.path.abspath(self.path)))
+            connection = sqlite3.connect(uri, uri=True)
+            self.local.connection = connection
+        return connection
+
+    def read(self, method, query, params):
+        cursor = self.reader().execute(query, params)
+        try:
+            return getattr(cursor, method)()
+        finally:
+            cursor.close()
+
+    # Coroutines
+    async def transaction(self, func, *args):
+        """
+        This function is coroutine.
+
+        Runs func(connection, *args) in the writer thread. Changes are committed
+        if it returns and rolled back if it raises, exception is raised here.
+        """
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    async def execute(self, query, params=()):
+        """
+        This function is coroutine.
+
+        Executes single write query and returns number of affected rows.
+        """
+        return await self.transaction(lambda db: db.execute(query, params).rowcount)
+
+    async def executemany(self, query, seq_of_params):
+        """
+        This function is coroutine.
+
+        Executes write query for each set of params and returns number of affected rows.
+        """
+        return await self.transaction(lambda db: db.executemany(query, seq_of_params).rowcount)
+
+    async def fetchone(self, query, params=()):
+        """
+        This function is coroutine.
+        """
+        return await asyncio.wrap_future(self.readers.submit(self.read, "fetchone", query, params))
+
+    async def fetchall(self, query, params=()):
+        """
+        This function is coroutine.
+        """
+        return await asyncio.wrap_future(self.readers.submit(self.read, "fetchall", query, params))
+
+    def close(self):
+        """
+        Finishes queued writes and closes connections.
+        """
+        self.queue.put(None)
+        self.writer_thread.join()
+        self.readers.shutdown()
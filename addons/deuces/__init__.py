@@ -1,3 +1,4 @@
 from addons.deuces.card import Card
 from addons.deuces.deck import Deck
-from addons.deuces.evaluator import Evaluator
+from addons.deuces.evaluator import Evaluator, HandState
+from addons.deuces.equity import EquityCalculator
@@ -0,0 +1,59 @@
+import numpy as np
+from addons.deuces.lookup import LookupTable
+
+
+class BatchEvaluator(object):
+    """
+    Evaluates many hands at once with NumPy.
+
+    Works exactly like Evaluator._direct, but on whole arrays of card ints:
+    suit counters are summed to find the flushing suit, its rankbits are
+    gathered from flush_lookup, and everything else goes through the
+    perfect hash of prime products. The lookup tables are the shared
+    ones, wrapped into arrays without copying.
+    """
+
+    def __init__(self, table=None):
+
+        self.table = table or LookupTable.shared()
+
+        self.suit_counters = np.array(LookupTable.SUIT_COUNTERS, dtype=np.int64)
+        self.flush_suit_lookup = np.frombuffer(self.table.flush_suit_lookup, dtype=np.uint8)
+        self.flush_lookup = np.frombuffer(self.table.flush_lookup, dtype=np.uint16)
+        self.unsuited_displacements = np.frombuffer(self.table.unsuited_displacements, dtype=np.uint16)
+        self.unsuited_ranks = np.frombuffer(self.table.unsuited_ranks, dtype=np.uint16)
+
+    def evaluate(self, hands, boards):
+        """
+        Returns an array of hand ranks in the range [1, 7462].
+
+        hands is an (n, k) array of card ints, boards is either an (n, m)
+        array or a single board of m cards shared by all hands.
+        k + m must be 5, 6 or 7.
+        """
+        hands = np.asarray(hands, dtype=np.int64)
+        boards = np.asarray(boards, dtype=np.int64)
+        if boards.ndim == 1:
+            boards = np.broadcast_to(boards, (hands.shape[0], boards.shape[0]))
+
+        cards = np.concatenate((hands, boards), axis=1)
+        if not 5 <= cards.shape[1] <= 7:
+            raise ValueError("Can't evaluate {} cards".format(cards.shape[1]))
+
+        # flushing suit of each hand, 0 if there's no flush
+        suits = (cards >> 12) & 0xF
+        suit_sums = self.suit_counters[suits].sum(axis=1)
+        flush_suits = self.flush_suit_lookup[suit_sums]
+
+        # rankbits of the cards in the flushing suit
+        rankbits = np.where(suits == flush_suits[:, None], (cards >> 16) & 0x1FFF, 0)
+        flush_ranks = self.flush_lookup[np.bitwise_or.reduce(rankbits, axis=1)]
+
+        # prime products through the perfect hash, see LookupTable.unsuited_rank()
+        products = np.prod(cards & 0xFF, axis=1).astype(np.uint64)
+        buckets = products % np.uint64(len(self.unsuited_displacements))
+        slots = (products ^ self.unsuited_displacements[buckets].astype(np.uint64)) \
+            % np.uint64(len(self.unsuited_ranks))
+        unsuited_ranks = self.unsuited_ranks[slots]
+
+        return np.where(flush_suits != 0, flush_ranks, unsuited_ranks).astype(np.int32)
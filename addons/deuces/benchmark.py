@@ -0,0 +1,212 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+import tracemalloc
+from random import Random
+from addons.deuces.deck import Deck
+from addons.deuces.lookup import LookupTable
+from addons.deuces.evaluator import Evaluator
+
+# number of 5 card hands in each rank class
+FIVE_CARD_CLASS_COUNTS = {
+    1: 40,
+    2: 624,
+    3: 3744,
+    4: 5108,
+    5: 10200,
+    6: 54912,
+    7: 123552,
+    8: 1098240,
+    9: 1302540,
+}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def random_hands(size, count, seed):
+    rng = Random(seed)
+    return [rng.sample(Deck.FULL_DECK, size) for _ in range(count)]
+
+
+def bench_evaluation(hands_count, seed):
+    """
+    Hands per second of each engine for 5, 6 and 7 cards.
+    """
+    results = {}
+    for engine in (Evaluator.COMBINATIONS, Evaluator.DIRECT):
+        evaluator = Evaluator(engine)
+        for size in (5, 6, 7):
+            hands = random_hands(size, hands_count, seed)
+            _, elapsed = timed(lambda: [evaluator.evaluate(hand[:2], hand[2:]) for hand in hands])
+            results["{}_{}".format(engine, size)] = hands_count / elapsed
+
+    try:
+        import numpy as np
+    except ImportError:
+        return results
+
+    evaluator = Evaluator()
+    for size in (5, 6, 7):
+        hands = np.array(random_hands(size, hands_count, seed))
+        _, elapsed = timed(evaluator.evaluate_batch, hands[:, :2], hands[:, 2:])
+        results["batch_{}".format(size)] = hands_count / elapsed
+
+    return results
+
+
+def bench_table():
+    """
+    Time and memory it takes to calculate lookup tables, and time to map them from cache.
+    """
+    table, build_time = timed(LookupTable)
+
+    # tracing slows the build down, so memory is measured on a separate build
+    tracemalloc.start()
+    LookupTable()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = sum(len(getattr(table, name)) * getattr(table, name).itemsize for name, _ in LookupTable.CACHE_TABLES)
+
+    # make sure the cache exists before timing reads
+    LookupTable.shared()
+    _, load_time = timed(LookupTable.read_table_from_disk, LookupTable.CACHE_PATH)
+
+    return {
+        "build_seconds": build_time,
+        "build_peak_bytes": peak,
+        "table_bytes": size,
+        "cache_load_seconds": load_time,
+    }
+
+
+def bench_deck(decks_count, seed):
+    """
+    Decks created, shuffled and fully dealt per second.
+    """
+    rng = Random(seed)
+
+    def deal():
+        for _ in range(decks_count):
+            Deck(rng=rng).draw(52)
+
+    _, elapsed = timed(deal)
+    return {"decks_per_second": decks_count / elapsed}
+
+
+def check_five_card_classes():
+    """
+    Evaluates all 2,598,960 five card hands and compares the number of
+    hands in each rank class and the number of distinct ranks.
+    """
+    evaluator = Evaluator()
+    counts = [0] * (LookupTable.MAX_HIGH_CARD + 1)
+    for hand in itertools.combinations(Deck.FULL_DECK, 5):
+        counts[evaluator.evaluate(hand, ())] += 1
+
+    class_counts = dict.fromkeys(FIVE_CARD_CLASS_COUNTS, 0)
+    for rank, count in enumerate(counts):
+        if count:
+            class_counts[evaluator.get_rank_class(rank)] += count
+
+    distinct = sum(1 for count in counts if count)
+
+    return {
+        "class_counts": class_counts,
+        "distinct_ranks": distinct,
+        "passed": class_counts == FIVE_CARD_CLASS_COUNTS and distinct == LookupTable.MAX_HIGH_CARD,
+    }
+
+
+def check_engines(hands_count, seed):
+    """
+    Compares the direct engine with the combinations engine on random 6 and 7 card hands,
+    and batch evaluation with evaluate() on random 5, 6 and 7 card hands if NumPy is installed.
+    """
+    combinations = Evaluator(Evaluator.COMBINATIONS)
+    direct = Evaluator(Evaluator.DIRECT)
+
+    mismatches = 0
+    for size in (6, 7):
+        for hand in random_hands(size, hands_count, seed):
+            if combinations.evaluate(hand[:2], hand[2:]) != direct.evaluate(hand[:2], hand[2:]):
+                mismatches += 1
+
+    result = {"hands": 2 * hands_count, "mismatches": mismatches, "passed": mismatches == 0}
+
+    try:
+        import numpy as np
+    except ImportError:
+        return result
+
+    evaluator = Evaluator()
+    batch_mismatches = 0
+    for size in (5, 6, 7):
+        hands = random_hands(size, hands_count, seed)
+        cards = np.array(hands)
+        ranks = evaluator.evaluate_batch(cards[:, :2], cards[:, 2:])
+        expected = np.array([evaluator.evaluate(hand[:2], hand[2:]) for hand in hands])
+        batch_mismatches += int(np.count_nonzero(ranks != expected))
+
+    result["batch_hands"] = 3 * hands_count
+    result["batch_mismatches"] = batch_mismatches
+    result["passed"] = mismatches == 0 and batch_mismatches == 0
+
+    return result
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(hands_count, decks_count, seed, sweep):
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "time": time.time(),
+        "seed": seed,
+        "evaluation_hands_per_second": bench_evaluation(hands_count, seed),
+        "lookup_table": bench_table(),
+        "deck": bench_deck(decks_count, seed),
+        "engines_check": check_engines(hands_count, seed),
+    }
+
+    if sweep:
+        sweep_result, elapsed = timed(check_five_card_classes)
+        sweep_result["seconds"] = elapsed
+        report["five_card_sweep"] = sweep_result
+
+    report["passed"] = report["engines_check"]["passed"] and report.get("five_card_sweep", {}).get("passed", True)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks and checks deuces hand evaluation")
+    parser.add_argument("--hands", type=int, default=100000, help="hands per evaluation benchmark")
+    parser.add_argument("--decks", type=int, default=20000, help="decks for shuffle benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed of random hands")
+    parser.add_argument("--no-sweep", action="store_true", help="skip checking all five card hands")
+    parser.add_argument("--output", help="write JSON report to file instead of stdout")
+    args = parser.parse_args()
+
+    result = run(args.hands, args.decks, args.seed, not args.no_sweep)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+    else:
+        print(json.dumps(result, indent=4))
+
+    sys.exit(0 if result["passed"] else 1)
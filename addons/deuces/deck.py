@@ -1,27 +1,38 @@
-from random import shuffle
+from array import array
+from random import Random
 from addons.deuces.card import Card
-from collections import deque
 
 
 class Deck:
     """
-    Class representing a deck. The first time we create, we seed the static
-    deck with the list of unique card integers. Each object instantiated simply
-    makes a copy of this object and shuffles it.
+    Class representing a deck. All 52 card integers are created once in
+    FULL_DECK. Each object instantiated simply copies this template into
+    a compact array and shuffles it with its own RNG, so a deck created
+    with the same seed always deals the same cards.
     """
 
-    def __init__(self):
+    FULL_DECK = tuple(Card.new(rank + suit) for rank in Card.STR_RANKS for suit in Card.CHAR_SUIT_TO_INT_SUIT)
 
-        self.deck = deque()
+    def __init__(self, seed=None, rng=None):
 
-        for rank in Card.STR_RANKS:
-            for suit, val in Card.CHAR_SUIT_TO_INT_SUIT.items():
-                self.deck.append(Card.new(rank + suit))
+        # Injected RNG is used as is, otherwise create one from seed (random if None)
+        self.rng = rng if rng is not None else Random(seed)
 
-        shuffle(self.deck)
+        self.deck = array('I', Deck.FULL_DECK)
+        self.rng.shuffle(self.deck)
+        self.position = 0
 
     def draw(self, amount: int):
-        return [self.get_card() for _ in range(amount)]
+        end = self.position + amount
+        if end > len(self.deck):
+            raise IndexError("Not enough cards left in deck")
+
+        cards = self.deck[self.position:end].tolist()
+        self.position = end
+        return cards
 
     def get_card(self):
-        return self.deck.popleft()
+        return self.draw(1)[0]
+
+    def remaining(self):
+        return len(self.deck) - self.position
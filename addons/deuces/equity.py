@@ -0,0 +1,346 @@
+import os
+import math
+import asyncio
+import itertools
+import multiprocessing
+from random import Random, SystemRandom
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from addons.deuces.deck import Deck
+from addons.deuces.evaluator import Evaluator
+
+
+# equity in range [0.0, 1.0] with the bounds of its confidence interval,
+# simulations is the number of enumerated deals for exact equity
+Equity = namedtuple("Equity", ["equity", "low", "high", "simulations"])
+
+# z-score of the 95% confidence interval
+Z_95 = 1.96
+
+# deals to enumerate at most when choosing exact equity automatically
+EXACT_LIMIT = 500000
+
+
+def simulate(hand, board, opponents, simulations, seed):
+    """
+    Plays out the board and random opponents' hands the given number
+    of times. Split pots count as a share of the pot.
+
+    Runs in worker processes, so everything it needs is in arguments.
+    Returns sum of shares and sum of their squares.
+    """
+    evaluator = Evaluator(Evaluator.DIRECT)
+    evaluate = evaluator.evaluate
+    rng = Random(seed)
+
+    remaining = remaining_cards(hand, board)
+    missing = 5 - len(board)
+    needed = missing + 2 * opponents
+
+    total = 0.0
+    total_sq = 0.0
+    for _ in range(simulations):
+        cards = rng.sample(remaining, needed)
+        runout = board + cards[:missing]
+
+        rank = evaluate(hand, runout)
+        ties = 1
+        for i in range(missing, needed, 2):
+            opponent_rank = evaluate(cards[i:i + 2], runout)
+            if opponent_rank < rank:
+                break
+            elif opponent_rank == rank:
+                ties += 1
+        else:
+            share = 1.0 / ties
+            total += share
+            total_sq += share * share
+
+    return total, total_sq
+
+
+def pairings(cards):
+    """
+    Yields all ways to split an even number of cards into 2 card hands.
+    """
+    if not cards:
+        yield ()
+        return
+
+    first = cards[0]
+    for i in range(1, len(cards)):
+        rest = cards[1:i] + cards[i + 1:]
+        for hands in pairings(rest):
+            yield ((first, cards[i]),) + hands
+
+
+def count_deals(board, opponents):
+    """
+    Number of distinct (runout, opponents' hands) deals left to enumerate.
+    Opponents are interchangeable, so each set of hands is counted once.
+    """
+    remaining = 50 - len(board)
+    missing = 5 - len(board)
+    cards = 2 * opponents
+
+    # (2k)! / (2^k * k!) ways to pair 2k cards
+    pairs = math.factorial(cards) // (2 ** opponents * math.factorial(opponents))
+
+    return math.comb(remaining, missing) * math.comb(remaining - missing, cards) * pairs
+
+
+def remaining_cards(hand, board):
+    # in card int order, so the same seed always gives the same runouts
+    known = set(hand) | set(board)
+    return sorted(card for card in Deck.FULL_DECK if card not in known)
+
+
+def enumerate_runouts(hand, board, opponents, runouts, part=0, parts=1):
+    """
+    Exact equity over the given runouts and every set of opponents' hands.
+    Opponents' cards can be split into parts by their first card, then only
+    sets starting with every parts-th remaining card from part are played.
+
+    Hands are evaluated incrementally: board and hero's hand are counted
+    once, and only runout cards are added to them, then only hole cards to
+    the runout. Each hand that is possible on a runout is evaluated once,
+    and the rank is reused by every set of opponents' hands it's part of.
+    Runs in worker processes, returns sum of shares and number of deals.
+    """
+    evaluator = Evaluator(Evaluator.DIRECT)
+    remaining = remaining_cards(hand, board)
+    board_state = evaluator.hand_state(board)
+    hero_state = evaluator.hand_state(hand + board)
+
+    total = 0.0
+    deals = 0
+    for runout in runouts:
+        rank = hero_state.peek(runout)
+
+        runout_state = board_state.copy()
+        runout_state.add(runout)
+        peek = runout_state.peek
+
+        dealt = set(runout)
+        left = [card for card in remaining if card not in dealt]
+        hand_ranks = {pair: peek(pair) for pair in itertools.combinations(left, 2)}
+
+        for first in range(part, len(left), parts):
+            card = left[first]
+
+            if opponents == 1:
+                for other in left[first + 1:]:
+                    opponent_rank = hand_ranks[(card, other)]
+                    if opponent_rank > rank:
+                        total += 1.0
+                    elif opponent_rank == rank:
+                        total += 0.5
+                deals += len(left) - first - 1
+                continue
+
+            for others in itertools.combinations(left[first + 1:], 2 * opponents - 1):
+                for hands in pairings((card,) + others):
+                    ties = 1
+                    for pair in hands:
+                        opponent_rank = hand_ranks[pair]
+                        if opponent_rank < rank:
+                            break
+                        elif opponent_rank == rank:
+                            ties += 1
+                    else:
+                        total += 1.0 / ties
+                    deals += 1
+
+    return total, deals
+
+
+def play_showdowns(hands, board, runouts):
+    """
+    Plays known hands out on the given runouts. Split pots count as a share of the pot.
+
+    Runs in worker processes, returns sums of shares of every hand,
+    sums of their squares and number of runouts.
+    """
+    evaluator = Evaluator(Evaluator.DIRECT)
+    evaluate = evaluator.evaluate
+
+    totals = [0.0] * len(hands)
+    totals_sq = [0.0] * len(hands)
+    count = 0
+    for runout in runouts:
+        runout = board + list(runout)
+        ranks = [evaluate(hand, runout) for hand in hands]
+        best = min(ranks)
+        share = 1.0 / ranks.count(best)
+        for i, rank in enumerate(ranks):
+            if rank == best:
+                totals[i] += share
+                totals_sq[i] += share * share
+        count += 1
+
+    return totals, totals_sq, count
+
+
+def sample_showdowns(hands, board, simulations, seed):
+    """
+    Same as play_showdowns(), but on random runouts.
+    """
+    rng = Random(seed)
+    remaining = remaining_cards([card for hand in hands for card in hand], board)
+    missing = 5 - len(board)
+
+    return play_showdowns(hands, board, (rng.sample(remaining, missing) for _ in range(simulations)))
+
+
+class EquityCalculator:
+    """
+    Equity of known hole cards against random opponents' hands.
+
+    Small spots (late streets, few opponents) are enumerated exactly,
+    everything else is estimated with Monte Carlo simulations.
+    Work is sharded across a process pool, every simulation shard gets its
+    own seeded RNG, so results are reproducible for a given seed.
+    """
+
+    def __init__(self, workers=None, exact_limit=EXACT_LIMIT):
+        self.workers = workers or os.cpu_count() or 1
+        self.exact_limit = exact_limit
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            # Forked workers would copy the bot's threads and locks mid-use, fresh ones only import the jobs
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def is_exact(self, board, opponents, exact):
+        """
+        Decides between exact and sampled equity, None means automatically.
+        """
+        if exact is None:
+            return count_deals(board, opponents) <= self.exact_limit
+        return exact
+
+    def jobs(self, hand, board, opponents, simulations, seed, exact):
+        """
+        Splits work into one job per worker: runouts for exact equity,
+        or parts of opponents' hands if there are fewer runouts than workers,
+        simulations with seeds derived from the given seed otherwise.
+        """
+        if len(hand) != 2 or len(board) > 5 or not 1 <= opponents <= 9 or simulations < 1:
+            raise ValueError("Invalid hand, board, number of opponents or simulations")
+
+        hand = list(hand)
+        board = list(board)
+
+        if exact:
+            runouts = list(itertools.combinations(remaining_cards(hand, board), 5 - len(board)))
+            if len(runouts) < self.workers:
+                # The river is a single runout, every worker plays all of them with its part of opponents' hands
+                return [(enumerate_runouts, hand, board, opponents, runouts, part, self.workers)
+                        for part in range(self.workers)]
+
+            size = -(-len(runouts) // self.workers)
+            return [(enumerate_runouts, hand, board, opponents, runouts[i:i + size])
+                    for i in range(0, len(runouts), size)]
+
+        seeds = Random(seed if seed is not None else SystemRandom().getrandbits(64))
+        size, rest = divmod(simulations, self.workers)
+
+        return [(simulate, hand, board, opponents, size + (i < rest), seeds.getrandbits(64))
+                for i in range(self.workers) if size + (i < rest)]
+
+    def calculate(self, hand, board, opponents, simulations=10000, seed=None, exact=None):
+        """
+        Blocks until all jobs are done.
+        """
+        exact = self.is_exact(board, opponents, exact)
+        executor = self.get_executor()
+        futures = [executor.submit(*job) for job in self.jobs(hand, board, opponents, simulations, seed, exact)]
+        results = [future.result() for future in futures]
+
+        return self.merge_exact(results) if exact else self.merge(results, simulations)
+
+    async def calculate_async(self, hand, board, opponents, simulations=10000, seed=None, exact=None):
+        """
+        This function is coroutine.
+
+        Same as calculate(), but waits for jobs without blocking the event loop.
+        """
+        exact = self.is_exact(board, opponents, exact)
+        executor = self.get_executor()
+        futures = [asyncio.wrap_future(executor.submit(*job))
+                   for job in self.jobs(hand, board, opponents, simulations, seed, exact)]
+        results = await asyncio.gather(*futures)
+
+        return self.merge_exact(results) if exact else self.merge(results, simulations)
+
+    def showdown_jobs(self, hands, board, simulations, seed):
+        """
+        Splits showdowns of known hands into one job per worker, like jobs().
+        Every runout is played if there are at most exact_limit of them.
+        """
+        if not 2 <= len(hands) <= 10 or any(len(hand) != 2 for hand in hands) or len(board) > 5 or simulations < 1:
+            raise ValueError("Invalid hands, board or number of simulations")
+
+        hands = [list(hand) for hand in hands]
+        board = list(board)
+        remaining = remaining_cards([card for hand in hands for card in hand], board)
+        missing = 5 - len(board)
+
+        if math.comb(len(remaining), missing) <= self.exact_limit:
+            runouts = list(itertools.combinations(remaining, missing))
+            size = -(-len(runouts) // self.workers)
+            return True, [(play_showdowns, hands, board, runouts[i:i + size]) for i in range(0, len(runouts), size)]
+
+        seeds = Random(seed if seed is not None else SystemRandom().getrandbits(64))
+        size, rest = divmod(simulations, self.workers)
+
+        return False, [(sample_showdowns, hands, board, size + (i < rest), seeds.getrandbits(64))
+                       for i in range(self.workers) if size + (i < rest)]
+
+    async def showdown_async(self, hands, board, simulations=10000, seed=None):
+        """
+        This function is coroutine.
+
+        Equity of every hand against the other known hands, only the board is left to deal.
+        Returns list of Equity in order of hands. Cancelling it cancels jobs which haven't started yet.
+        """
+        exact, jobs = self.showdown_jobs(hands, board, simulations, seed)
+        executor = self.get_executor()
+        futures = [asyncio.wrap_future(executor.submit(*job)) for job in jobs]
+        results = await asyncio.gather(*futures)
+
+        equities = []
+        for i in range(len(hands)):
+            if exact:
+                equities.append(self.merge_exact([(result[0][i], result[2]) for result in results]))
+            else:
+                equities.append(self.merge([(result[0][i], result[1][i]) for result in results], simulations))
+
+        return equities
+
+    @staticmethod
+    def merge_exact(results):
+        total = sum(result[0] for result in results)
+        deals = sum(result[1] for result in results)
+
+        equity = total / deals
+        return Equity(equity, equity, equity, deals)
+
+    @staticmethod
+    def merge(results, simulations):
+        total = sum(result[0] for result in results)
+        total_sq = sum(result[1] for result in results)
+
+        mean = total / simulations
+        variance = max(total_sq / simulations - mean * mean, 0.0)
+        margin = Z_95 * math.sqrt(variance / simulations)
+
+        return Equity(mean, max(mean - margin, 0.0), min(mean + margin, 1.0), simulations)
@@ -14,15 +14,31 @@ class Evaluator(object):
     all calculations are done with bit arithmetic and table lookups.
     """
 
-    def __init__(self):
+    # evaluation engines
+    COMBINATIONS = "combinations"  # best of all 5 card subsets
+    DIRECT = "direct"  # single lookup for 5, 6 and 7 cards
 
-        self.table = LookupTable()
+    def __init__(self, engine=COMBINATIONS):
 
-        self.hand_size_map = {
-            5: self._five,
-            6: self._six,
-            7: self._seven
-        }
+        if engine not in (Evaluator.COMBINATIONS, Evaluator.DIRECT):
+            raise ValueError("Unknown evaluation engine: {}".format(engine))
+
+        self.engine = engine
+        self.table = LookupTable.shared()
+        self.batch_evaluator = None
+
+        if engine == Evaluator.DIRECT:
+            self.hand_size_map = {
+                5: self._direct,
+                6: self._direct,
+                7: self._direct
+            }
+        else:
+            self.hand_size_map = {
+                5: self._five,
+                6: self._six,
+                7: self._seven
+            }
 
     def evaluate(self, cards, board):
         """
@@ -37,6 +53,18 @@ class Evaluator(object):
 
         return self.hand_size_map[len(all_cards)](all_cards)
 
+    def evaluate_batch(self, hands, boards):
+        """
+        Evaluates arrays of hands at once, see BatchEvaluator.evaluate().
+
+        Requires NumPy, which is imported on first use.
+        """
+        if self.batch_evaluator is None:
+            from addons.deuces.batch import BatchEvaluator
+            self.batch_evaluator = BatchEvaluator(self.table)
+
+        return self.batch_evaluator.evaluate(hands, boards)
+
     def _five(self, cards):
         """
         Performs an evalution given cards in integer form, mapping them to
@@ -48,13 +76,12 @@ class Evaluator(object):
         # if flush
         if cards[0] & cards[1] & cards[2] & cards[3] & cards[4] & 0xF000:
             handOR = (cards[0] | cards[1] | cards[2] | cards[3] | cards[4]) >> 16
-            prime = Card.prime_product_from_rankbits(handOR)
-            return self.table.flush_lookup[prime]
+            return self.table.flush_lookup[handOR]
 
         # otherwise
         else:
             prime = Card.prime_product_from_hand(cards)
-            return self.table.unsuited_lookup[prime]
+            return self.table.unsuited_rank(prime)
 
     def _six(self, cards):
         """
@@ -90,6 +117,41 @@ class Evaluator(object):
 
         return minimum
 
+    def _direct(self, cards):
+        """
+        Evaluates 5, 6 or 7 cards without going through the 5 card subsets.
+
+        Suit counters of all cards are summed up to find the flushing suit,
+        if there is one, its rankbits are the index of the best flush.
+        Otherwise the prime product of all cards is the index of the best
+        hand among all rank multisets.
+        """
+        counters = LookupTable.SUIT_COUNTERS
+        suit_sum = 0
+        for c in cards:
+            suit_sum += counters[(c >> 12) & 0xF]
+
+        # if flush
+        suit = self.table.flush_suit_lookup[suit_sum]
+        if suit:
+            suit <<= 12
+            handOR = 0
+            for c in cards:
+                if c & suit:
+                    handOR |= c
+            return self.table.flush_lookup[handOR >> 16]
+
+        # otherwise
+        else:
+            prime = Card.prime_product_from_hand(cards)
+            return self.table.unsuited_rank(prime)
+
+    def hand_state(self, cards):
+        """
+        Returns a HandState which starts with the given cards.
+        """
+        return HandState(self.table, cards)
+
     def get_rank_class(self, hr):
         """
         Returns the class of hand given the hand hand_rank
@@ -184,3 +246,85 @@ class Evaluator(object):
                 else:
                     print("Players %s tied for the win with a %s\n" % (winners,
                         self.class_to_string(self.get_rank_class(self.evaluate(hands[winners[0]], board)))))
+
+
+class HandState(object):
+    """
+    Hand that grows street by street, evaluated incrementally.
+
+    Keeps the same counters as Evaluator._direct (suit sum, rankbits of
+    each suit and the prime product), so every added card is processed
+    once and the rank of the current cards is a single lookup.
+    Rank is None until there are at least 5 cards.
+    """
+
+    def __init__(self, table, cards=()):
+
+        self.table = table
+        self.suit_sum = 0
+        # indexed by suit nibble
+        self.suit_rankbits = [0] * 9
+        self.product = 1
+        self.size = 0
+        self.rank = None
+
+        self.add(cards)
+
+    def add(self, cards):
+        """
+        Adds cards and updates rank.
+        """
+        counters = LookupTable.SUIT_COUNTERS
+        for c in cards:
+            suit = (c >> 12) & 0xF
+            self.suit_sum += counters[suit]
+            self.suit_rankbits[suit] |= c >> 16
+            self.product *= c & 0xFF
+        self.size += len(cards)
+
+        if self.size >= 5:
+            # if flush
+            suit = self.table.flush_suit_lookup[self.suit_sum]
+            if suit:
+                self.rank = self.table.flush_lookup[self.suit_rankbits[suit]]
+            # otherwise
+            else:
+                self.rank = self.table.unsuited_rank(self.product)
+
+        return self.rank
+
+    def peek(self, cards):
+        """
+        Returns rank of the current cards with the given ones added,
+        the hand itself doesn't change. At least 5 cards in total.
+        """
+        counters = LookupTable.SUIT_COUNTERS
+        suit_sum = self.suit_sum
+        product = self.product
+        for c in cards:
+            suit_sum += counters[(c >> 12) & 0xF]
+            product *= c & 0xFF
+
+        # if flush
+        suit = self.table.flush_suit_lookup[suit_sum]
+        if suit:
+            rankbits = self.suit_rankbits[suit]
+            for c in cards:
+                if (c >> 12) & 0xF == suit:
+                    rankbits |= c >> 16
+            return self.table.flush_lookup[rankbits]
+
+        # otherwise
+        return self.table.unsuited_rank(product)
+
+    def copy(self):
+        """
+        Returns a hand with the same cards, which grows on its own.
+        """
+        state = HandState(self.table)
+        state.suit_sum = self.suit_sum
+        state.suit_rankbits = list(self.suit_rankbits)
+        state.product = self.product
+        state.size = self.size
+        state.rank = self.rank
+        return state
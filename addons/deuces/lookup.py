@@ -1,4 +1,9 @@
+import os
+import mmap
+import array
+import struct
 import itertools
+import threading
 from addons.deuces.card import Card
 
 
@@ -18,7 +23,8 @@ class LookupTable(object):
     -------------------------
     TOTAL            7462
 
-    Here we create a lookup table which maps:
+    Here we create lookup tables which map:
+        5 card flush's rankbits => rank in range [1, 7462]
         5 card hand's unique prime product => rank in range [1, 7462]
 
     Examples:
@@ -59,18 +65,171 @@ class LookupTable(object):
         9: "High Card"
     }
 
+    # suit nibble (cdhs) => 3-bit counter added to the suit sum of a hand,
+    # so the counts of all four suits fit into one 12 bit integer
+    SUIT_COUNTERS = [0, 1, 8, 0, 64, 0, 0, 0, 512]
+
+    # binary cache of the tables, see write_table_to_disk()
+    CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookup.bin")
+    CACHE_MAGIC = b"DEUC"
+    CACHE_VERSION = 2
+    # magic, version, number of entries in each array
+    CACHE_HEADER = struct.Struct("=4sH4I")
+    # array attribute => typecode
+    CACHE_TABLES = [
+        ("flush_suit_lookup", "B"),
+        ("flush_lookup", "H"),
+        ("unsuited_displacements", "H"),
+        ("unsuited_ranks", "H"),
+    ]
+
+    # process-wide table, see shared()
+    _shared = None
+    _shared_lock = threading.Lock()
+
     def __init__(self):
         """
         Calculates lookup tables
         """
-        # create dictionaries
+        # create dictionaries, they are packed into arrays once complete
         self.flush_lookup = {}
         self.unsuited_lookup = {}
+        self.flush_suit_lookup = {}
 
         # create the lookup table in piecewise fashion
         self.flushes()  # this will call straights and high cards method,
                         # we reuse some of the bit sequences
         self.multiples()
+        self.direct()
+
+        self.pack()
+
+    def direct(self):
+        """
+        Tables for evaluating 5, 6 and 7 cards with a single lookup.
+
+        With up to 7 cards at most one suit can have 5 or more cards,
+        and if it does, no unsuited hand can beat the best flush in it.
+        So the 5 card tables are extended with:
+
+        * suit sum => suit nibble of the flushing suit
+        * rankbits of the flushing suit (6 or 7 bits set) => rank
+        * prime product of 6 or 7 cards => best rank without flushes
+        """
+        # 1) Flush suit detection. Suit counts (s, h, d, c) of 5 to 7 cards
+        # where one of the counters is >= 5
+        suits = (1, 2, 4, 8)
+        for counts in itertools.product(range(8), repeat=4):
+            if not 5 <= sum(counts) <= 7 or max(counts) < 5:
+                continue
+            suit_sum = sum(LookupTable.SUIT_COUNTERS[s] * n for s, n in zip(suits, counts))
+            self.flush_suit_lookup[suit_sum] = suits[counts.index(max(counts))]
+
+        # 2) Flushes. The best 5 card flush of 6 or 7 bits is the best
+        # flush among the patterns with one bit less
+        previous = dict(self.flush_lookup)
+        for _ in range(2):
+            current = {}
+            for rankbits, rank in previous.items():
+                for i in Card.INT_RANKS:
+                    bit = 1 << i
+                    if rankbits & bit:
+                        continue
+                    best = current.get(rankbits | bit, LookupTable.MAX_HIGH_CARD)
+                    if rank < best:
+                        current[rankbits | bit] = rank
+            self.flush_lookup.update(current)
+            previous = current
+
+        # 3) Rank multisets. Same idea - every 6 or 7 card multiset is reached
+        # from each of its 5 or 6 card sub-multisets by multiplying in one prime
+        previous = dict(self.unsuited_lookup)
+        for _ in range(2):
+            current = {}
+            for product, rank in previous.items():
+                for prime in Card.PRIMES:
+                    # no more than four cards of the same rank
+                    if not product % prime ** 4:
+                        continue
+                    best = current.get(product * prime, LookupTable.MAX_HIGH_CARD)
+                    if rank < best:
+                        current[product * prime] = rank
+            self.unsuited_lookup.update(current)
+            previous = current
+
+    def pack(self):
+        """
+        Packs calculated dictionaries into arrays:
+
+        * flush_suit_lookup - 4096 entries indexed by the suit sum
+        * flush_lookup - 8192 entries indexed by the 13 bit rankbits
+        * unsuited_displacements, unsuited_ranks - perfect hash of
+          the prime products of 5 to 7 cards, see unsuited_rank()
+
+        Missing entries are 0.
+        """
+        self.flush_suit_lookup = LookupTable._indexed('B', self.flush_suit_lookup, 1 << 12)
+        self.flush_lookup = LookupTable._indexed('H', self.flush_lookup, 1 << 13)
+
+        self.unsuited_displacements, self.unsuited_ranks = LookupTable._perfect_hash(self.unsuited_lookup)
+        del self.unsuited_lookup
+
+    @staticmethod
+    def _indexed(typecode, table, size):
+        packed = array.array(typecode, bytes(array.array(typecode).itemsize * size))
+        for index, value in table.items():
+            packed[index] = value
+        return packed
+
+    @staticmethod
+    def _perfect_hash(table):
+        """
+        Hash and displace: keys are split into buckets by key % buckets,
+        then every bucket, largest first, gets the smallest displacement
+        which moves all its keys into free slots:
+
+        slot = (key ^ displacements[key % buckets]) % slots
+
+        Slots are 25% more than keys, so the search is quick and
+        displacements fit into 16 bits.
+        """
+        buckets = len(table) // 4
+        slots = len(table) * 5 // 4
+
+        keys_in_bucket = [[] for _ in range(buckets)]
+        for key in table:
+            keys_in_bucket[key % buckets].append(key)
+
+        displacements = array.array('H', bytes(2 * buckets))
+        ranks = array.array('H', bytes(2 * slots))
+        for bucket in sorted(range(buckets), key=lambda b: -len(keys_in_bucket[b])):
+            keys = keys_in_bucket[bucket]
+            if not keys:
+                break
+
+            displacement = 1
+            while True:
+                taken = [(key ^ displacement) % slots for key in keys]
+                if len(set(taken)) == len(taken) and not any(ranks[slot] for slot in taken):
+                    break
+                displacement += 1
+
+            displacements[bucket] = displacement
+            for key, slot in zip(keys, taken):
+                ranks[slot] = table[key]
+
+        return displacements, ranks
+
+    def unsuited_rank(self, prime_product):
+        """
+        Returns the best unsuited rank of 5 to 7 cards with the given prime product.
+
+        Only products of valid hands are in the table, anything else
+        returns some rank or 0.
+        """
+        displacements = self.unsuited_displacements
+        return self.unsuited_ranks[(prime_product ^ displacements[prime_product % len(displacements)])
+                                   % len(self.unsuited_ranks)]
 
     def flushes(self):
         """
@@ -78,6 +237,8 @@ class LookupTable(object):
 
         Lookup is done on 13 bit integer (2^13 > 7462):
         xxxbbbbb bbbbbbbb => integer hand index
+
+        so flushes don't need prime products at all.
         """
 
         # straight flushes in rank order
@@ -127,16 +288,14 @@ class LookupTable(object):
         # rank 1 = Royal Flush!
         rank = 1
         for sf in straight_flushes:
-            prime_product = Card.prime_product_from_rankbits(sf)
-            self.flush_lookup[prime_product] = rank
+            self.flush_lookup[sf] = rank
             rank += 1
 
         # we start the counting for flushes on max full house, which
         # is the worst rank that a full house can have (2,2,2,3,3)
         rank = LookupTable.MAX_FULL_HOUSE + 1
         for f in flushes:
-            prime_product = Card.prime_product_from_rankbits(f)
-            self.flush_lookup[prime_product] = rank
+            self.flush_lookup[f] = rank
             rank += 1
 
         # we can reuse these bit sequences for straights
@@ -248,13 +407,102 @@ class LookupTable(object):
                 self.unsuited_lookup[product] = rank
                 rank += 1
 
-    def write_table_to_disk(self, table, filepath):
+    @classmethod
+    def shared(cls):
+        """
+        Returns the immutable lookup table shared by the whole process.
+
+        The table is mapped from the binary cache, or calculated and
+        written to it if the cache is missing or was written by
+        another version.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                table = cls.read_table_from_disk(cls.CACHE_PATH)
+                if table is None:
+                    table = cls()
+                    table.write_table_to_disk(cls.CACHE_PATH)
+                    table.freeze()
+                cls._shared = table
+
+            return cls._shared
+
+    def freeze(self):
+        """
+        Replaces all arrays with read-only memoryviews.
+        """
+        for name, _ in LookupTable.CACHE_TABLES:
+            setattr(self, name, memoryview(getattr(self, name)).toreadonly())
+
+    def write_table_to_disk(self, filepath):
+        """
+        Writes lookup tables to disk in a compact binary format:
+
+        header | flush_suit_lookup | flush_lookup | unsuited_displacements | unsuited_ranks
+
+        Arrays are written as is and padded to 8 bytes, so they
+        can be cast directly from an mmap. The file is replaced atomically.
         """
-        Writes lookup table to disk
+        arrays = [getattr(self, name) for name, _ in LookupTable.CACHE_TABLES]
+        header = LookupTable.CACHE_HEADER.pack(LookupTable.CACHE_MAGIC, LookupTable.CACHE_VERSION,
+                                               *[len(a) for a in arrays])
+
+        tmp_path = "{}.{}.tmp".format(filepath, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self._pad(header))
+                for a in arrays:
+                    f.write(self._pad(bytes(a)))
+            os.replace(tmp_path, filepath)
+        except OSError as e:
+            print("Failed to write lookup table cache. Reason: {}".format(type(e).__name__))
+
+    @classmethod
+    def read_table_from_disk(cls, filepath):
+        """
+        Maps lookup tables written by write_table_to_disk() into memory.
+        Arrays are read-only memoryviews of the mapping, nothing is copied.
+
+        Returns None if the file doesn't exist or has a different version.
         """
-        with open(filepath, 'w') as f:
-            for prime_prod, rank in table.items():
-                f.write(str(prime_prod) + "," + str(rank) + '\n')
+        try:
+            with open(filepath, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            return cls._from_buffer(memoryview(mm))
+        except ValueError:
+            return None
+
+    @classmethod
+    def _from_buffer(cls, view):
+        if len(view) < cls.CACHE_HEADER.size:
+            return None
+
+        magic, version, *sizes = cls.CACHE_HEADER.unpack_from(view)
+        if magic != cls.CACHE_MAGIC or version != cls.CACHE_VERSION:
+            return None
+
+        table = cls.__new__(cls)
+        offset = cls._padded(cls.CACHE_HEADER.size)
+        for (name, typecode), size in zip(cls.CACHE_TABLES, sizes):
+            end = offset + array.array(typecode).itemsize * size
+            if end > len(view):
+                raise ValueError("Truncated lookup table cache")
+            setattr(table, name, view[offset:end].cast(typecode))
+            offset = cls._padded(end)
+
+        return table
+
+    @staticmethod
+    def _padded(size):
+        return (size + 7) & ~7
+
+    @staticmethod
+    def _pad(data):
+        return data + bytes(LookupTable._padded(len(data)) - len(data))
 
     def get_lexographically_next_bit_sequence(self, bits):
         """
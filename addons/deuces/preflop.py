@@ -0,0 +1,174 @@
+import os
+import sys
+import array
+import struct
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from addons.deuces.card import Card
+from addons.deuces.equity import simulate
+
+
+class PreflopTable(object):
+    """
+    All-in preflop equity of the 169 starting hand classes against
+    1 to 8 random opponents' hands (2 to 9 players).
+
+    Classes are laid out in a 13x13 grid of ranks, index is row * 13 + col:
+
+    * pairs on the diagonal - (rank, rank)
+    * suited hands below it, row > col - (high rank, low rank)
+    * offsuit hands above it, row < col - (low rank, high rank)
+
+    so the class of two cards is found without any lookups.
+    The table is generated by running this module and shipped in
+    preflop.bin, it's loaded on first lookup.
+    """
+
+    PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop.bin")
+    MAGIC = b"PREF"
+    VERSION = 1
+    # magic, version, simulations per entry
+    HEADER = struct.Struct("<4sHI")
+
+    CLASSES = 169
+    MIN_PLAYERS = 2
+    MAX_PLAYERS = 9
+    # equities are stored as 16 bit fractions
+    SCALE = 65535
+
+    _equities = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def hand_class(card1, card2):
+        """
+        Returns class index in range [0, 168] of two card ints.
+        """
+        rank1 = (card1 >> 8) & 0xF
+        rank2 = (card2 >> 8) & 0xF
+        high, low = (rank1, rank2) if rank1 >= rank2 else (rank2, rank1)
+
+        # suited
+        if card1 & card2 & 0xF000:
+            return high * 13 + low
+        # offsuit and pairs
+        return low * 13 + high
+
+    @staticmethod
+    def class_hand(hand_class):
+        """
+        Returns two card ints representing the class.
+        """
+        row, col = divmod(hand_class, 13)
+        if row > col:
+            return [Card.new(Card.STR_RANKS[row] + 's'), Card.new(Card.STR_RANKS[col] + 's')]
+        return [Card.new(Card.STR_RANKS[col] + 's'), Card.new(Card.STR_RANKS[row] + 'h')]
+
+    @staticmethod
+    def class_to_string(hand_class):
+        row, col = divmod(hand_class, 13)
+        if row == col:
+            return Card.STR_RANKS[row] * 2
+        elif row > col:
+            return Card.STR_RANKS[row] + Card.STR_RANKS[col] + 's'
+        return Card.STR_RANKS[col] + Card.STR_RANKS[row] + 'o'
+
+    @classmethod
+    def equity(cls, card1, card2, players):
+        """
+        Returns all-in equity in range [0.0, 1.0] of two cards at a table of players.
+        """
+        if not cls.MIN_PLAYERS <= players <= cls.MAX_PLAYERS:
+            raise ValueError("Preflop equity is available for 2 to 9 players")
+
+        equities = cls._equities
+        if equities is None:
+            equities = cls.load()
+
+        index = cls.hand_class(card1, card2) * (cls.MAX_PLAYERS - 1) + players - cls.MIN_PLAYERS
+        return equities[index] / cls.SCALE
+
+    @classmethod
+    def load(cls):
+        with cls._lock:
+            if cls._equities is None:
+                with open(cls.PATH, 'rb') as f:
+                    data = f.read()
+
+                magic, version, _ = cls.HEADER.unpack_from(data)
+                if magic != cls.MAGIC or version != cls.VERSION:
+                    raise ValueError("Unsupported preflop table {}".format(cls.PATH))
+
+                # stored in little endian
+                equities = array.array('H')
+                equities.frombytes(data[cls.HEADER.size:])
+                if sys.byteorder == 'big':
+                    equities.byteswap()
+                cls._equities = equities
+
+            return cls._equities
+
+
+def generate(path, simulations, workers):
+    """
+    Calculates all (class, players) entries and writes the table to path.
+
+    Every finished entry is appended to a progress file next to it,
+    so an interrupted run continues where it has stopped.
+    """
+    progress_path = path + ".progress"
+    entries = PreflopTable.MAX_PLAYERS - 1
+    done = {}
+
+    if os.path.isfile(progress_path):
+        with open(progress_path) as f:
+            for line in f:
+                fields = line.split(",")
+                # a partially written last line is calculated again
+                if line.endswith("\n") and len(fields) == 4 and int(fields[2]) == simulations:
+                    done[int(fields[0]), int(fields[1])] = float(fields[3])
+
+    todo = [(hand_class, players)
+            for hand_class in range(PreflopTable.CLASSES)
+            for players in range(PreflopTable.MIN_PLAYERS, PreflopTable.MAX_PLAYERS + 1)
+            if (hand_class, players) not in done]
+
+    print("{} of {} entries left".format(len(todo), PreflopTable.CLASSES * entries))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(progress_path, 'a') as progress:
+        # entries are seeded by their position, so reruns give the same table
+        futures = {executor.submit(simulate, PreflopTable.class_hand(hand_class), [], players - 1,
+                                   simulations, hand_class * entries + players): (hand_class, players)
+                   for hand_class, players in todo}
+
+        for future in as_completed(futures):
+            hand_class, players = futures[future]
+            done[hand_class, players] = future.result()[0] / simulations
+            progress.write("{},{},{},{}\n".format(hand_class, players, simulations, done[hand_class, players]))
+            progress.flush()
+            print("{} with {} players: {:.4f}".format(PreflopTable.class_to_string(hand_class), players,
+                                                      done[hand_class, players]))
+
+    equities = array.array('H', [round(done[hand_class, players] * PreflopTable.SCALE)
+                                 for hand_class in range(PreflopTable.CLASSES)
+                                 for players in range(PreflopTable.MIN_PLAYERS, PreflopTable.MAX_PLAYERS + 1)])
+    if sys.byteorder == 'big':
+        equities.byteswap()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PreflopTable.HEADER.pack(PreflopTable.MAGIC, PreflopTable.VERSION, simulations))
+        f.write(equities.tobytes())
+    os.replace(tmp_path, path)
+    os.remove(progress_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates preflop equity table")
+    parser.add_argument("--simulations", type=int, default=10000, help="simulations per entry")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--path", default=PreflopTable.PATH, help="output file")
+    args = parser.parse_args()
+
+    generate(args.path, args.simulations, args.workers)
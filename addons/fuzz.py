@@ -0,0 +1,197 @@
+import sys
+import json
+import time
+import argparse
+from random import Random
+from fractions import Fraction
+from collections import namedtuple
+from addons import holdem
+from addons.holdem import Action, EventType, GameStatus, PlayerStatus
+from addons.history import verify
+
+# Stands in for Discord user in simulated hands
+User = namedtuple("User", ["id"])
+
+
+def reference_pots(stakes):
+    """
+    Brute force counterpart of holdem.resolve_pots: every chip level is resolved
+    on its own, adjacent levels the same seats can win make one pot.
+    Returns list of [amount, eligible seats] and (seat, amount) of the stake nobody matched or None.
+    """
+    pots = []
+    returned = None
+    top = max(stake for _, stake, _ in stakes)
+
+    def live(level):
+        return [seat for seat, (_, stake, rank) in enumerate(stakes) if stake >= level and rank is not None]
+
+    for level in range(1, top + 1):
+        contributors = [seat for seat, (_, stake, _) in enumerate(stakes) if stake >= level]
+        eligible = live(level)
+
+        if len(contributors) == 1 and eligible:
+            returned = (contributors[0], returned[1] + 1 if returned else 1)
+            continue
+
+        # Chips put in only by folded players go to the closest level below, or above if there's none
+        below = level
+        while not eligible and below > 1:
+            below -= 1
+            eligible = live(below)
+        above = level
+        while not eligible and above < top:
+            above += 1
+            eligible = live(above)
+
+        if pots and pots[-1][1] == eligible:
+            pots[-1][0] += len(contributors)
+        else:
+            pots.append([len(contributors), eligible])
+
+    return pots, returned
+
+
+def exact_shares(pot, stakes):
+    """
+    Whether pot goes to the best rank among its players and every winner's share
+    is the exact split, but one odd chip to the first winners in seat order.
+    """
+    rank = min(stakes[seat][2] for seat in pot.players)
+    winners = [seat for seat in pot.players if stakes[seat][2] == rank]
+    exact = Fraction(pot.amount, len(winners))
+    amounts = [amount for _, amount in pot.shares]
+
+    return ([seat for seat, _ in pot.shares] == winners
+            and sum(amounts) == pot.amount
+            # Nobody gets more than one odd chip and they go first
+            and all(abs(amount - exact) < 1 for amount in amounts)
+            and amounts == sorted(amounts, reverse=True))
+
+
+def random_stakes(rng):
+    players = rng.randint(2, 9)
+    levels = [rng.randint(1, 120) for _ in range(rng.randint(1, players))]
+
+    stakes = []
+    for seat in range(players):
+        # Few ranks, so split pots are common
+        rank = None if rng.random() < 0.3 else rng.randint(1, 4)
+        stakes.append((seat, rng.choice(levels), rank))
+
+    # Somebody always gets to showdown
+    if all(rank is None for _, _, rank in stakes):
+        seat, stake, _ = stakes[0]
+        stakes[0] = (seat, stake, 1)
+
+    return stakes
+
+
+def check_pots(count, seed):
+    """
+    Compares holdem.resolve_pots with reference_pots on random stakes. Pots must
+    be the same, payouts must add up to the stakes and every pot must be split
+    exactly, but its odd chips.
+    """
+    rng = Random(seed)
+    failures = []
+
+    for case in range(count):
+        stakes = random_stakes(rng)
+        pots, returned = holdem.resolve_pots(stakes)
+
+        payouts = [0] * len(stakes)
+        for pot in pots:
+            for seat, amount in pot.shares:
+                payouts[seat] += amount
+        if returned is not None:
+            payouts[returned[0]] += returned[1]
+
+        reference, reference_returned = reference_pots(stakes)
+        passed = (sum(payouts) == sum(stake for _, stake, _ in stakes)
+                  and [[pot.amount, pot.players] for pot in pots] == reference
+                  and returned == reference_returned
+                  and all(exact_shares(pot, stakes) for pot in pots))
+
+        if not passed:
+            failures.append({"case": case, "stakes": stakes, "payouts": payouts})
+
+    return {"cases": count, "failures": failures[:10], "passed": not failures}
+
+
+def random_table(rng, evaluator=None):
+    game = holdem.Game(rng.getrandbits(32), evaluator)
+    seated = [game.add_player(User(str(i)), rng.randint(1, 30) * 100) for i in range(rng.randint(2, 10))]
+    return game, seated
+
+
+def check_hands(count, seed):
+    """
+    Plays random hands through the engine. Money must stay the same after
+    every hand and every hand record must replay to the same record.
+    """
+    rng = Random(seed)
+    game, seated = random_table(rng)
+    total = sum(player.balance for player in seated)
+
+    hands = 0
+    conservation = []
+    mismatches = []
+
+    while hands < count:
+        events = game.start_hand()
+        if game.status is GameStatus.PENDING:
+            # Everyone but one is busted, seat new table
+            game, seated = random_table(rng, game.evaluator)
+            total = sum(player.balance for player in seated)
+            continue
+
+        while game.status is not GameStatus.PENDING:
+            player = next(player for player in game.players if player.status is PlayerStatus.THONKING)
+            roll = rng.random()
+            if roll < 0.02:
+                events.extend(game.remove_player(player))
+                continue
+
+            actions = game.get_available_actions(player)
+            action = rng.choice(actions)
+            amount = rng.randint(1, 400) if action in (Action.BET, Action.RAISE) else 0
+            events.extend(game.act(player, action, amount))
+
+        if sum(player.balance for player in seated) != total:
+            conservation.append(hands)
+            total = sum(player.balance for player in seated)
+
+        for event in events:
+            if event.type is EventType.RECORD and not verify(event.info, game.evaluator):
+                mismatches.append(hands)
+
+        hands += 1
+
+    return {
+        "hands": hands,
+        "conservation_failures": conservation[:10],
+        "replay_mismatches": mismatches[:10],
+        "passed": not conservation and not mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Randomized checks of the poker engine")
+    parser.add_argument("--pots", type=int, default=20000, help="random stakes to resolve")
+    parser.add_argument("--hands", type=int, default=5000, help="random hands to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of random cases")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = {
+        "seed": args.seed,
+        "pots_check": check_pots(args.pots, args.seed),
+        "hands_check": check_hands(args.hands, args.seed),
+    }
+    result["seconds"] = time.perf_counter() - start
+    result["passed"] = result["pots_check"]["passed"] and result["hands_check"]["passed"]
+
+    print(json.dumps(result, indent=4))
+
+    sys.exit(0 if result["passed"] else 1)
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import array
+import struct
+import argparse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from addons import holdem
+from addons.holdem import Action, EventType, HandRecord
+
+# Stands in for Discord user when hands are replayed
+Seat = namedtuple("Seat", ["id"])
+
+
+class HandHistory:
+    """
+    Finished hands in rotating append-only files.
+
+    Every file starts with magic and version, then hands follow one after
+    another, each prefixed with its length:
+
+    * seed, time, number of seats, board cards, actions and payouts, and blinds
+    * seats - length prefixed user id and balance before blinds
+    * hole cards of every seat and board cards as 32 bit card ints
+    * actions - seat, action and amount
+    * payouts - seat and amount
+
+    Hands are encoded on the event loop, files are written in a worker thread.
+    """
+
+    MAGIC = b"HAND"
+    # Version 1 had no blinds, its files aren't read
+    VERSION = 2
+    FILE_HEADER = struct.Struct("<4sH")
+    LENGTH = struct.Struct("<I")
+    # seed, time, seats, board cards, actions, payouts, small and big blind
+    HEADER = struct.Struct("<QdBBHHII")
+    BALANCE = struct.Struct("<q")
+    ACTION = struct.Struct("<BBq")
+    PAYOUT = struct.Struct("<Bq")
+
+    PREFIX = "hands-"
+    SUFFIX = ".bin"
+
+    def __init__(self, path, max_file_size=16 * 1024 * 1024, max_files=32):
+        self.path = path
+        self.max_file_size = max_file_size
+        # Oldest files are deleted, None keeps all of them
+        self.max_files = max_files
+        self.file = None
+        self.number = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hand-history")
+
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def file_names(cls, path):
+        names = [name for name in os.listdir(path) if name.startswith(cls.PREFIX) and name.endswith(cls.SUFFIX)]
+        return sorted(names, key=lambda name: int(name[len(cls.PREFIX):-len(cls.SUFFIX)]))
+
+    @classmethod
+    def encode(cls, record: HandRecord):
+        parts = [cls.HEADER.pack(record.seed, record.time, len(record.seats), len(record.board),
+                                 len(record.actions), len(record.payouts), *record.blinds)]
+
+        for user_id, balance in record.seats:
+            user_id = str(user_id).encode()
+            parts.append(bytes((len(user_id),)) + user_id + cls.BALANCE.pack(balance))
+
+        cards = array.array('I', [card for hand in record.hands for card in hand] + list(record.board))
+        if sys.byteorder == 'big':
+            cards.byteswap()
+        parts.append(cards.tobytes())
+
+        parts.extend(cls.ACTION.pack(seat, action.value, amount) for seat, action, amount in record.actions)
+        parts.extend(cls.PAYOUT.pack(seat, amount) for seat, amount in record.payouts)
+
+        data = b"".join(parts)
+        return cls.LENGTH.pack(len(data)) + data
+
+    @classmethod
+    def decode(cls, data):
+        seed, hand_time, seats_count, board_count, actions_count, payouts_count, *blinds = cls.HEADER.unpack_from(data)
+        offset = cls.HEADER.size
+
+        seats = []
+        for _ in range(seats_count):
+            length = data[offset]
+            user_id = data[offset + 1:offset + 1 + length].decode()
+            offset += 1 + length
+            seats.append((user_id, cls.BALANCE.unpack_from(data, offset)[0]))
+            offset += cls.BALANCE.size
+
+        cards = array.array('I')
+        cards.frombytes(data[offset:offset + 4 * (2 * seats_count + board_count)])
+        if sys.byteorder == 'big':
+            cards.byteswap()
+        offset += 4 * len(cards)
+
+        hands = [tuple(cards[i:i + 2]) for i in range(0, 2 * seats_count, 2)]
+        board = list(cards[2 * seats_count:])
+
+        actions = []
+        for seat, action, amount in cls.ACTION.iter_unpack(data[offset:offset + actions_count * cls.ACTION.size]):
+            actions.append((seat, Action(action), amount))
+        offset += actions_count * cls.ACTION.size
+
+        payouts = list(cls.PAYOUT.iter_unpack(data[offset:offset + payouts_count * cls.PAYOUT.size]))
+
+        return HandRecord(seed, hand_time, seats, hands, board, actions, payouts, tuple(blinds))
+
+    def write(self, record: HandRecord):
+        """
+        Queues hand to be written, returns concurrent.futures.Future.
+        """
+        return self.executor.submit(self.append, self.encode(record))
+
+    # Run in the worker thread
+    def append(self, data):
+        try:
+            if self.file is None:
+                # Last file might end with a partially written hand, so every start gets a new file
+                names = self.file_names(self.path)
+                self.number = int(names[-1][len(self.PREFIX):-len(self.SUFFIX)]) if names else 0
+                self.rotate()
+            elif self.file.tell() + len(data) > self.max_file_size:
+                self.rotate()
+
+            self.file.write(data)
+            self.file.flush()
+        except OSError as e:
+            print("Failed to write hand history. Reason: {}".format(type(e).__name__))
+
+    def open(self, number):
+        self.number = number
+        self.file = open(os.path.join(self.path, "{}{}{}".format(self.PREFIX, number, self.SUFFIX)), 'ab')
+        if self.file.tell() == 0:
+            self.file.write(self.FILE_HEADER.pack(self.MAGIC, self.VERSION))
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+        self.open(self.number + 1)
+
+        if self.max_files is not None:
+            for name in self.file_names(self.path)[:-self.max_files]:
+                os.remove(os.path.join(self.path, name))
+
+    def close(self):
+        """
+        Writes queued hands and closes current file.
+        """
+        self.executor.shutdown(wait=True)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_hands(path):
+    """
+    Yields hands of a history file or of all files in a history directory, oldest first.
+    A hand which was being written when the bot stopped is skipped.
+    """
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in HandHistory.file_names(path)]
+    else:
+        paths = [path]
+
+    for file_path in paths:
+        with open(file_path, 'rb') as f:
+            magic, version = HandHistory.FILE_HEADER.unpack(f.read(HandHistory.FILE_HEADER.size))
+            if magic != HandHistory.MAGIC:
+                raise ValueError("{} is not a hand history file".format(file_path))
+            if version != HandHistory.VERSION:
+                raise ValueError("Unsupported version {} of hand history file {}".format(version, file_path))
+
+            while True:
+                prefix = f.read(HandHistory.LENGTH.size)
+                if len(prefix) < HandHistory.LENGTH.size:
+                    break
+
+                length = HandHistory.LENGTH.unpack(prefix)[0]
+                data = f.read(length)
+                if len(data) < length:
+                    break
+
+                yield HandHistory.decode(data)
+
+
+def replay(record: HandRecord, evaluator=None):
+    """
+    Plays recorded actions through the engine and returns record of the replayed hand.
+    """
+    game = holdem.Game(evaluator=evaluator)
+    game.small_blind, game.big_blind = record.blinds
+    # Every recorded seat was dealt in
+    game.min_balance = 0
+    players = [game.add_player(Seat(user_id), balance) for user_id, balance in record.seats]
+
+    events = game.start_hand(record.seed)
+    for seat, action, amount in record.actions:
+        if action is Action.LEAVE:
+            events.extend(game.remove_player(players[seat]))
+        else:
+            events.extend(game.act(players[seat], action, amount))
+
+    for event in events:
+        if event.type is EventType.RECORD:
+            return event.info
+
+    return None
+
+
+def verify(record: HandRecord, evaluator=None):
+    """
+    Whether replaying the hand deals the same cards and makes the same payouts.
+    """
+    replayed = replay(record, evaluator)
+    # Everything but the time
+    return replayed is not None and replayed._replace(time=record.time) == record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays hand history through the poker engine")
+    parser.add_argument("path", help="history file or directory")
+    args = parser.parse_args()
+
+    evaluator = holdem.Game().evaluator
+    hands = 0
+    mismatches = []
+
+    start = time.perf_counter()
+    for hand in read_hands(args.path):
+        if not verify(hand, evaluator):
+            mismatches.append(hands)
+        hands += 1
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "hands": hands,
+        "mismatches": mismatches,
+        "hands_per_second": hands / elapsed if elapsed else None,
+    }, indent=4))
+
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,660 @@
+# Texas Hold'em engine without any Discord or database code.
+# Actions go in, events come out, so hands can be simulated on their own.
+
+import time
+from random import Random
+from addons import deuces
+from enum import Enum
+from collections import deque, namedtuple
+
+
+class GameStatus(Enum):
+    PENDING = 0
+    PREFLOP = 1
+    FLOP = 2
+    TURN = 3
+    RIVER = 4
+    ENDGAME = 5
+
+    def next(self):
+        return GameStatus(self.value + 1)
+
+
+class PlayerStatus(Enum):
+    WAITING = 0
+    # For debug purposes
+    BLINDED = 1
+    CALLED = 2
+    CHECKED = 3
+    BET = 4
+    RAISED = 5
+    ALLIN = 6
+    THONKING = 7
+    FOLDED = 8
+
+
+class Action(Enum):
+    CHECK = 0
+    CALL = 1
+    BET = 2
+    RAISE = 3
+    ALLIN = 4
+    FOLD = 5
+    # Only in hand records, player left the table
+    LEAVE = 6
+
+
+class Rejection(Enum):
+    # It's not player's turn or hand isn't running
+    NOT_TURN = 0
+    # Bet or raise amount isn't positive
+    AMOUNT = 1
+    # There's a stake to answer
+    CHECK = 2
+    CALL_FUNDS = 3
+    BET_FUNDS = 4
+    # Round is opened already, raise instead
+    BET_OPENED = 5
+    RAISE_FUNDS = 6
+    ALLIN_FUNDS = 7
+
+
+class EventType(Enum):
+    # Player is removed before the hand for not having enough money
+    BUSTED = 0
+    # Player put amount in the bank, info - (status, balance before, current stake, total stake)
+    STAKE = 1
+    # Hole cards are dealt, info - [(player, hand)]
+    DEALT = 2
+    # Player is to act, amount - bank, info - (available actions, round's highest stake)
+    TURN = 3
+    # Action isn't allowed, info - Rejection
+    REJECTED = 4
+    # Cards are placed, info - (status, table cards, [(player, rank)])
+    STREET = 5
+    # Player got amount from the bank
+    PAYOUT = 6
+    # Pot is won at showdown, amount - pot, info - (pot number, winners, rank)
+    POT = 7
+    # Stake nobody matched went back to player
+    RETURNED = 8
+    # Hand is over. Player is set if everyone else folded and amount is what he won,
+    # otherwise info - [(player, hand)] of players at showdown
+    HAND_END = 9
+    # Comes right before HAND_END, info - HandRecord of the hand
+    RECORD = 10
+
+
+Event = namedtuple("Event", ["type", "player", "amount", "info"])
+
+# Everything needed to replay a hand. Seats are (user id, balance before blinds),
+# hands are hole cards of each seat, actions are (seat, Action, amount),
+# payouts are (seat, amount) in order they were made and blinds are (small, big).
+HandRecord = namedtuple("HandRecord", ["seed", "time", "seats", "hands", "board", "actions", "payouts", "blinds"])
+
+# Pot resolved at showdown: amount, players who could win it, winners,
+# their rank and what every winner gets as (player, amount), odd chips included
+Pot = namedtuple("Pot", ["amount", "players", "winners", "rank", "shares"])
+
+
+def resolve_pots(stakes):
+    """
+    Splits stakes of a finished hand into main and side pots in one pass.
+
+    stakes are (player, total stake, rank) in seat order, rank is None for
+    players who can't win. Every pot goes to the best rank among players
+    who put in all of it and odd chips of a split pot go to its first
+    winners in seat order. Chips put in only by folded players go to the
+    pot below them, and so does a layer the same players can win.
+
+    Returns list of Pots and (player, amount) of the stake nobody matched or None.
+    """
+    order = sorted(range(len(stakes)), key=lambda seat: stakes[seat][1])
+
+    # Every distinct stake closes a layer put in by everyone who has at least that stake
+    layers = []
+    returned = None
+    carry = 0
+    previous = 0
+    for position, seat in enumerate(order):
+        stake = stakes[seat][1]
+        if stake == previous:
+            continue
+
+        contributors = order[position:]
+        amount = (stake - previous) * len(contributors)
+        previous = stake
+
+        eligible = sorted(contributor for contributor in contributors if stakes[contributor][2] is not None)
+
+        if len(contributors) == 1 and eligible:
+            returned = (stakes[seat][0], amount)
+        elif eligible and layers and layers[-1][1] == eligible:
+            # Stakes of folded players only split it, it's still the same pot
+            layers[-1] = (layers[-1][0] + amount, eligible)
+        elif eligible:
+            layers.append((amount + carry, eligible))
+            carry = 0
+        elif layers:
+            layers[-1] = (layers[-1][0] + amount, layers[-1][1])
+        else:
+            carry += amount
+
+    pots = []
+    for amount, eligible in layers:
+        # NOTE: Lower value - higher rank
+        rank = min(stakes[seat][2] for seat in eligible)
+        winners = [seat for seat in eligible if stakes[seat][2] == rank]
+
+        share, odd_chips = divmod(amount, len(winners))
+        shares = [(stakes[seat][0], share + 1 if i < odd_chips else share) for i, seat in enumerate(winners)]
+
+        pots.append(Pot(amount, [stakes[seat][0] for seat in eligible], [stakes[seat][0] for seat in winners],
+                        rank, shares))
+
+    return pots, returned
+
+
+class Dealer:
+
+    def __init__(self, table, evaluator):
+        self.deck = deuces.Deck(table.seed)
+        self.players = table.players
+        self.table = table
+        self.evaluator = evaluator
+
+    def deal_cards(self):
+        for player in self.players:
+            player.hand.extend(self.deck.draw(2))
+            player.hand_state = self.evaluator.hand_state(player.hand)
+
+    def place_cards(self):
+        if len(self.table.cards) >= 3:
+            cards = self.deck.draw(1)
+        else:
+            cards = self.deck.draw(3)
+
+        self.table.cards.extend(cards)
+
+        # Evaluate only new cards for players who can still win pots
+        for player in self.players:
+            if player.status is not PlayerStatus.FOLDED:
+                player.hand_state.add(cards)
+
+
+class Player:
+
+    # Tournaments seat thousands of players, so they're kept small
+    __slots__ = ("id", "user", "status", "hand", "hand_state", "current_stake", "total_stake", "balance", "fold_position")
+
+    def __init__(self, user, balance):
+        self.id = user.id
+        self.user = user
+        self.status = PlayerStatus.WAITING
+        self.hand = []
+        # Incremental evaluation of hand and table cards
+        self.hand_state = None
+        self.current_stake = 0
+        self.total_stake = 0
+        self.balance = balance
+        self.fold_position = 0
+
+    def add_balance(self, amount):
+        self.balance += amount
+
+    def withdraw_balance(self, amount):
+        self.balance -= amount
+
+    def set_status(self, status):
+        self.status = status
+
+    def set_current_stake(self, stake):
+        self.current_stake = stake
+
+    def set_total_stake(self, stake):
+        self.total_stake += stake
+
+    def set_fold_position(self, position):
+        self.fold_position = position
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Table:
+
+    def __init__(self, players, evaluator, seed):
+        self.players = players
+        # Seed of the deck, the same seed deals the same cards
+        self.seed = seed
+        self.rotation = deque()
+        self.dealer = Dealer(self, evaluator)
+        self.cards = []
+        self.bank = 0
+
+    def add_bank(self, amount):
+        self.bank += amount
+
+    def withdraw_bank(self, amount):
+        self.bank -= amount
+
+    def get_dealer(self):
+        return self.dealer
+
+
+class Game:
+    """
+    Betting state machine of one table.
+
+    Every public method returns list of events it caused,
+    nothing is sent or written anywhere.
+    """
+
+    SMALL_BLIND = 20
+    BIG_BLIND = SMALL_BLIND + 20
+    # Players with lower balance are removed before the hand
+    MIN_BALANCE = 100
+
+    def __init__(self, seed=None, evaluator=None):
+        # Tournaments change them between hands
+        self.small_blind = self.SMALL_BLIND
+        self.big_blind = self.BIG_BLIND
+        self.min_balance = self.MIN_BALANCE
+        self.status = GameStatus.PENDING
+        self.table = None
+        self.players = []
+        self.round_highest_stake = 0
+        self.fold_position = 0
+        self.evaluator = evaluator or deuces.Evaluator(deuces.Evaluator.DIRECT)
+        # Every hand gets its deck seed from table's RNG, so the whole table can be replayed from its seed
+        self.rng = Random(seed)
+        self.events = []
+        # Record of the current hand and seat of every player in it by user id
+        self.record = None
+        self.seats = {}
+
+    def emit(self, event_type, player=None, amount=0, info=None):
+        self.events.append(Event(event_type, player, amount, info))
+
+    def pop_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    # Players
+    def add_player(self, user, balance):
+        player = Player(user, balance)
+        self.players.append(player)
+        return player
+
+    def remove_player(self, player: Player):
+
+        self.players.remove(player)
+
+        # Variables are uninitialized if game is not in process
+        if self.status is not GameStatus.PENDING:
+            self.record_action(player, Action.LEAVE, 0)
+            # Remove player from rotation, but let him be in table, since we need him in pots calculations
+            if player in self.table.rotation:
+                self.table.rotation.remove(player)
+            # If rotation contains only 1 player - get last player and end the game.
+            if player.status is PlayerStatus.THONKING or len(self.table.rotation) == 1:
+                player.set_status(PlayerStatus.FOLDED)
+                self.next_player()
+
+        return self.pop_events()
+
+    def start_hand(self, seed=None):
+        """
+        Deals a new hand, seed of the deck is taken from table's RNG unless it's given.
+        """
+
+        self.table = Table(list(self.players), self.evaluator, self.rng.getrandbits(64) if seed is None else seed)
+        self.status = GameStatus.PREFLOP
+
+        # Check if player has balance lower than minimal and remove him from the game
+        for player in list(self.table.players):
+            if player.balance < self.min_balance:
+                self.players.remove(player)
+                self.table.players.remove(player)
+                self.emit(EventType.BUSTED, player)
+
+        if len(self.table.players) < 2:
+            self.reset_hand()
+            return self.pop_events()
+
+        self.seats = {player.id: seat for seat, player in enumerate(self.table.players)}
+        self.record = HandRecord(self.table.seed, time.time(),
+                                 [(player.id, player.balance) for player in self.table.players], [], [], [], [],
+                                 (self.small_blind, self.big_blind))
+
+        self.take_blind(self.table.players)
+
+        # Deal cards
+        self.table.dealer.deal_cards()
+        self.record.hands.extend(tuple(player.hand) for player in self.table.players)
+        self.emit(EventType.DEALT, info=[(player, tuple(player.hand)) for player in self.table.players])
+
+        # Set rotation
+        self.table.rotation = deque(self.table.players)
+
+        self.next_player()
+
+        return self.pop_events()
+
+    # Actions
+    def act(self, player: Player, action: Action, amount=0):
+
+        # Recorded first, since the hand and its record might be finished by the action
+        recorded = self.record_action(player, action, amount if action in (Action.BET, Action.RAISE) else 0)
+
+        if self.status is GameStatus.PENDING or player.status is not PlayerStatus.THONKING:
+            self.emit(EventType.REJECTED, player, info=Rejection.NOT_TURN)
+        elif action is Action.CHECK:
+            self.make_check(player)
+        elif action is Action.CALL:
+            self.make_call(player)
+        elif action is Action.FOLD:
+            self.make_fold(player)
+        elif action is Action.ALLIN:
+            self.make_all_in(player)
+        elif amount <= 0:
+            self.emit(EventType.REJECTED, player, info=Rejection.AMOUNT)
+        elif action is Action.BET:
+            self.make_bet(player, amount)
+        elif action is Action.RAISE:
+            self.make_raise(player, amount)
+
+        # Rejected actions don't change anything, so they aren't recorded
+        if recorded and self.events and self.events[0].type is EventType.REJECTED:
+            self.record.actions.pop()
+
+        return self.pop_events()
+
+    def record_action(self, player: Player, action: Action, amount: int):
+        # Players who joined during the hand aren't in it
+        seat = self.seats.get(player.id)
+        if seat is None or self.table.players[seat] is not player:
+            return False
+
+        self.record.actions.append((seat, action, amount))
+        return True
+
+    def get_available_actions(self, player: Player):
+
+        if player.balance >= self.round_highest_stake != 0:
+            return [Action.RAISE, Action.CALL, Action.ALLIN, Action.FOLD]
+        elif player.balance > self.round_highest_stake == 0:
+            return [Action.BET, Action.CHECK, Action.ALLIN, Action.FOLD]
+        elif player.balance == 0:
+            return [Action.CHECK, Action.FOLD]
+        elif player.balance < self.round_highest_stake:
+            return [Action.ALLIN, Action.FOLD]
+
+        return []
+
+    def process_stake(self, player: Player, amount: int, stake: int, status: PlayerStatus):
+
+        balance = player.balance
+
+        player.withdraw_balance(amount)
+        player.set_total_stake(amount)
+        self.table.add_bank(amount)
+
+        player.set_current_stake(stake)
+        player.set_status(status)
+
+        self.emit(EventType.STAKE, player, amount, (status, balance, stake, player.total_stake))
+
+    def make_check(self, player: Player):
+
+        if player.balance != 0 and player.current_stake < self.round_highest_stake:
+            self.emit(EventType.REJECTED, player, info=Rejection.CHECK)
+            return
+
+        player.set_status(PlayerStatus.CHECKED)
+
+        self.next_player()
+
+    def make_fold(self, player: Player):
+
+        player.set_status(PlayerStatus.FOLDED)
+
+        # Used for detection in side pots distribution
+        self.fold_position += 1
+
+        player.set_fold_position(self.fold_position)
+
+        self.table.rotation.remove(player)
+
+        self.next_player()
+
+    def make_call(self, player: Player):
+
+        if self.round_highest_stake == 0:
+            self.make_check(player)
+            return
+
+        if player.balance < self.round_highest_stake:
+            self.emit(EventType.REJECTED, player, info=Rejection.CALL_FUNDS)
+            return
+
+        # Difference between stake to answer on and player's current stake
+        amount_difference = self.round_highest_stake - player.current_stake
+
+        self.process_stake(player, amount_difference, self.round_highest_stake, PlayerStatus.CALLED)
+
+        self.next_player()
+
+    def make_bet(self, player: Player, amount: int):
+
+        if player.balance < amount:
+            self.emit(EventType.REJECTED, player, info=Rejection.BET_FUNDS)
+            return
+        elif self.round_highest_stake != 0:
+            self.emit(EventType.REJECTED, player, info=Rejection.BET_OPENED)
+            return
+
+        # Set initial round's highest stake
+        self.round_highest_stake = amount
+
+        self.process_stake(player, amount, amount, PlayerStatus.BET)
+
+        self.next_player()
+
+    def make_raise(self, player: Player, amount: int):
+
+        # Raise ON amount more than round's highest stake
+        raise_amount = self.round_highest_stake + amount
+
+        if player.balance + player.current_stake < raise_amount:
+            self.emit(EventType.REJECTED, player, info=Rejection.RAISE_FUNDS)
+            return
+
+        # Raise is always higher than round's highest stake
+        self.round_highest_stake = raise_amount
+
+        # Difference between raised amount and current stake
+        amount_difference = raise_amount - player.current_stake
+
+        self.process_stake(player, amount_difference, raise_amount, PlayerStatus.RAISED)
+
+        self.next_player()
+
+    def make_all_in(self, player: Player):
+
+        if player.balance == 0:
+            self.emit(EventType.REJECTED, player, info=Rejection.ALLIN_FUNDS)
+            return
+
+        # Player's stake in current round must be sum of player's balance and his current stake
+        player_stake = player.balance + player.current_stake
+
+        # If this stake is higher than round's highest stake - set new round's highest stake
+        if player_stake > self.round_highest_stake:
+            self.round_highest_stake = player_stake
+
+        self.process_stake(player, player.balance, player_stake, PlayerStatus.ALLIN)
+
+        self.next_player()
+
+    def take_blind(self, players):
+
+        self.round_highest_stake = self.big_blind
+
+        # Short stack puts in everything it has
+        small_blind = min(self.small_blind, players[0].balance)
+        big_blind = min(self.big_blind, players[1].balance)
+
+        self.process_stake(players[0], small_blind, small_blind, PlayerStatus.BLINDED)
+        self.process_stake(players[1], big_blind, big_blind, PlayerStatus.BLINDED)
+
+    def give_money(self, player: Player, amount: int):
+        # Take money from the table bank
+        self.table.withdraw_bank(amount)
+        # Give them to player
+        player.add_balance(amount)
+
+        self.record.payouts.append((self.seats[player.id], amount))
+        self.emit(EventType.PAYOUT, player, amount)
+
+    # Rounds
+    def next_player(self):
+
+        # Get next round
+        self.next_round(self.table.rotation)
+
+        # Avoid errors after setting GameStatus to PENDING
+        if self.status is GameStatus.PENDING:
+            return
+
+        # Move out player
+        player = self.table.rotation.popleft()
+
+        # Put him in the end of rotation
+        self.table.rotation.append(player)
+
+        # Set player status
+        player.set_status(PlayerStatus.THONKING)
+
+        self.emit(EventType.TURN, player, self.table.bank, (self.get_available_actions(player), self.round_highest_stake))
+
+    def set_next_round(self, status: GameStatus):
+
+        self.table.get_dealer().place_cards()
+
+        for player in self.table.rotation:
+            # Reset states and nullify current stakes
+            player.set_status(PlayerStatus.WAITING)
+            player.current_stake = 0
+            self.round_highest_stake = 0
+
+        self.status = status
+
+        ranks = [(player, player.hand_state.rank) for player in self.table.rotation]
+        self.emit(EventType.STREET, info=(status, tuple(self.table.cards), ranks))
+
+    def next_round(self, rotation: deque):
+
+        # Before we check for next round we need to make sure it's necessary
+        if len(rotation) == 1:
+            last_player = rotation.popleft()
+            bank = self.table.bank
+            self.give_money(last_player, bank)
+
+            self.finish_record()
+
+            # Reset game
+            self.reset_hand()
+
+            self.emit(EventType.HAND_END, last_player, bank, [])
+            return
+
+        is_new_round = True
+
+        for player in rotation:
+            # We need to check if all stakes are equal to the highest one.
+            # Except the case when player went all-in.
+            if player.current_stake < self.round_highest_stake and player.balance != 0:
+                player.set_status(PlayerStatus.WAITING)
+
+            # And if we found player who is waiting and has non-zero balance - continue current round.
+            if player.status is PlayerStatus.WAITING:
+                is_new_round = False
+                break
+
+        # If all players made their moves - proceed to next round
+        if is_new_round:
+
+            # Get next status
+            next_status = self.status.next()
+
+            # Set it if it's not end of the game
+            if next_status is not GameStatus.ENDGAME:
+                self.set_next_round(next_status)
+            else:
+                # Calculate pots and distribute money
+                self.showdown()
+
+                # Collect players' hands
+                hands = [(player, tuple(player.hand)) for player in rotation if player.status is not PlayerStatus.FOLDED]
+
+                self.finish_record()
+
+                # Reset game
+                self.reset_hand()
+
+                self.emit(EventType.HAND_END, info=hands)
+
+    def showdown(self):
+
+        # Rank on the river has been evaluated while placing cards, so every hand is read once
+        stakes = [(player, player.total_stake,
+                   None if player.status is PlayerStatus.FOLDED else player.hand_state.rank)
+                  for player in self.table.players]
+
+        pots, returned = resolve_pots(stakes)
+
+        # Sum up everything each player gets, so every balance changes once
+        payouts = {}
+        for number, pot in enumerate(pots):
+            self.emit(EventType.POT, amount=pot.amount, info=(number, pot.winners, pot.rank))
+            for winner, amount in pot.shares:
+                payouts[winner] = payouts.get(winner, 0) + amount
+
+        if returned is not None:
+            player, amount = returned
+            self.emit(EventType.RETURNED, player, amount)
+            payouts[player] = payouts.get(player, 0) + amount
+
+        for player, amount in payouts.items():
+            self.give_money(player, amount)
+
+    def finish_record(self):
+        self.record.board.extend(self.table.cards)
+        self.emit(EventType.RECORD, info=self.record)
+
+    def reset_hand(self):
+
+        # Reset status
+        self.status = GameStatus.PENDING
+
+        # Reset statuses, stakes and hands
+        for player in self.players:
+            player.set_status(PlayerStatus.WAITING)
+            player.hand = []
+            player.hand_state = None
+            player.current_stake = 0
+            player.total_stake = 0
+            player.fold_position = 0
+
+        # Reset initial highest stake
+        self.round_highest_stake = 0
+
+        # Reset fold position
+        self.fold_position = 0
+
+        # Burn the table
+        self.table = None
+        self.record = None
+        self.seats = {}
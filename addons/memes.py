@@ -22,15 +22,11 @@ class Memes:
     async def memes(self, ctx):
         """List memes."""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx.message, cursor, "memes"):
+        if not await utils.db_check(self.bot, ctx.message, "memes"):
             return
 
         msg = "`Usage: Kurisu, meme <name>`\n```List of memes:\n"
-        cursor.execute("SELECT * FROM memes")
-        data = cursor.fetchall()
-        cursor.close()
+        data = await self.bot.db.fetchall("SELECT * FROM memes")
         for row in data:
             msg += row[0] + "\n"
         msg += "random\n"
@@ -42,27 +38,21 @@ class Memes:
     async def meme(self, ctx, *, name: str):
         """Shows meme. Usage: Kurisu, meme <name>"""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx.message, cursor, "memes"):
+        if not await utils.db_check(self.bot, ctx.message, "memes"):
             return
 
         if name == "random":
-            cursor.execute("SELECT * FROM memes")
-            data = cursor.fetchall()
+            data = await self.bot.db.fetchall("SELECT * FROM memes")
             memes = []
             for row in data:
                 memes.append(row[1])
             meme = choice(memes)
         else:
-            cursor.execute("SELECT * FROM memes WHERE name=?", (name,))
-            row = cursor.fetchone()
+            row = await self.bot.db.fetchone("SELECT * FROM memes WHERE name=?", (name,))
             if not row:
                 await self.bot.send_message(ctx.message.channel, "Meme not found!")
                 return
             meme = row[1]
-
-        cursor.close()
         await self.send(meme)
 
 
@@ -16,26 +16,25 @@ class Mod:
         self.bot = bot
         self.timers_storage = bot.unmute_timers
 
-        # Open cursor and check for mutes in database
-        cursor = self.bot.db.cursor()
-
-        # Check for those members, who need to be unmuted now
-        self.members_to_unmute(cursor)
-
-        # Check for those members, who need to be unmuted later
-        self.members_to_update_mute(cursor)
-
-        # Close cursor
-        cursor.close()
+        # Check for mutes in database without blocking the bot
+        self.bot.loop.create_task(self.load_mutes())
 
         print('Addon "{}" loaded'.format(self.__class__.__name__))
 
-    def members_to_unmute(self, cursor):
-        cursor.execute("SELECT * FROM mutes WHERE mute_time < strftime('%s','now')")
-        to_unmute_now_data = cursor.fetchall()
+    async def load_mutes(self):
+        try:
+            # Check for those members, who need to be unmuted now
+            await self.members_to_unmute()
+        finally:
+            # Check for those members, who need to be unmuted later, however unmuting has gone
+            await self.members_to_update_mute()
+
+    async def members_to_unmute(self):
+        to_unmute_now_data = await self.bot.db.fetchall("SELECT * FROM mutes WHERE mute_time < strftime('%s','now')")
         if to_unmute_now_data:
-            unmute_tasks = []
             print("Users with expired mute found. Removing mutes...")
+            # Remove members with expired mute from database
+            await self.bot.db.execute("DELETE FROM mutes WHERE mute_time < strftime('%s','now')")
             for row in to_unmute_now_data:
                 # row[0] - ID
                 # row[1] - Member ID
@@ -45,20 +44,14 @@ class Mod:
                 for server in self.bot.servers:
                     if server.id == row[4]:
                         member = server.get_member(row[1])
-                        # Since we can't use async in __init__ we we'll create Future task.
-                        task = asyncio.ensure_future(self.set_permissions(server, member, None))
-                        # Add task to array
-                        unmute_tasks.append(task)
-                        # Add callback so task get removed from array when it's done
-                        task.add_done_callback(unmute_tasks.remove)
+                        # Member might have left the server
+                        if member is not None:
+                            # Own task for every member, so one failure doesn't keep the others muted
+                            self.bot.loop.create_task(self.unmute_expired(server, member))
                         break
-            # Remove members with expired mute from database
-            self.bot.db.execute("DELETE FROM mutes WHERE mute_time < strftime('%s','now')")
-            self.bot.db.commit()
 
-    def members_to_update_mute(self, cursor):
-        cursor.execute("SELECT * FROM mutes")
-        to_unmute_later_data = cursor.fetchall()
+    async def members_to_update_mute(self):
+        to_unmute_later_data = await self.bot.db.fetchall("SELECT * FROM mutes")
         if to_unmute_later_data:
             print("Users with not expired mute found.")
             for row in to_unmute_later_data:
@@ -70,6 +63,8 @@ class Mod:
                 for server in self.bot.servers:
                     if server.id == row[4]:
                         member = server.get_member(row[1])
+                        if member is None:
+                            break
                         seconds_to_unmute = row[3] - time.time()
                         # Prevent creating multiple tasks on 'reload' command
                         if member.id not in self.timers_storage[server.id]:
@@ -77,6 +72,12 @@ class Mod:
                             unmute_timer = self.bot.loop.create_task(self.unmute_timer(server, member, seconds_to_unmute))
                             self.timers_storage[server.id].update({member.id: unmute_timer})
 
+    async def unmute_expired(self, server, member):
+        try:
+            await self.set_permissions(server, member, None)
+        except discord.HTTPException as e:
+            print("Failed to unmute {}. Reason: {}".format(member.name, type(e).__name__))
+
     # Send message
     async def send(self, msg):
         await self.bot.say(msg)
@@ -109,21 +110,19 @@ class Mod:
             await self.set_permissions(server, member, None)
 
             # Remove muted member from storage
-            self.remove_muted_member(member, server)
+            await self.remove_muted_member(member, server)
 
             print("Member {} has been unmuted.".format(member.name))
 
         except asyncio.CancelledError:
             pass
 
-    def remove_muted_member(self, member, server):
-        db = self.bot.db
-        values = (member.id, server.id)
-        db.execute("DELETE FROM mutes WHERE member_id=? AND server_id=?", values)
-        db.commit()
-
+    async def remove_muted_member(self, member, server):
         del self.timers_storage[server.id][member.id]
 
+        values = (member.id, server.id)
+        await self.bot.db.execute("DELETE FROM mutes WHERE member_id=? AND server_id=?", values)
+
     # Commands
     @commands.command(pass_context=True)
     @checks.is_access_allowed(required_level=2)
@@ -180,10 +179,8 @@ class Mod:
             self.timers_storage[server.id].update({member.id: unmute_timer})
 
             # Write muted member to database
-            db = self.bot.db
             values = (member.id, member.name, period, server.id)
-            db.execute("INSERT INTO mutes(member_id, member_name, mute_time, server_id) VALUES (?,?,strftime('%s','now') + ?,?)", values)
-            db.commit()
+            await self.bot.db.execute("INSERT INTO mutes(member_id, member_name, mute_time, server_id) VALUES (?,?,strftime('%s','now') + ?,?)", values)
 
             def convert_time(secs):
                 return {
@@ -226,7 +223,7 @@ class Mod:
         # Remove mute task for a member and remove him from database
         if member.id in self.timers_storage[server.id]:
             self.timers_storage[server.id][member.id].cancel()
-            self.remove_muted_member(member, server)
+            await self.remove_muted_member(member, server)
 
         await self.send("Member {} has been unmuted by command.".format(member.name))
 
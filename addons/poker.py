@@ -1,701 +1,1281 @@
 # Deuces library is used for poker hand evaluation
 # https://github.com/worldveil/deuces
 
-import sqlite3
+import os
+import json
+import time
+import functools
+import contextlib
+import bisect
 import asyncio
+import sqlite3
 import discord
 from random import randint
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from addons import ai
 from addons import utils
 from addons import deuces
-from operator import attrgetter
+from addons import holdem
+from addons.holdem import GameStatus, PlayerStatus, Action, Rejection, EventType, Player
+from addons.deuces.preflop import PreflopTable
+from addons.database import Database
+from addons.scheduler import DeadlineScheduler
+from addons.history import HandHistory
+from addons.tournament import Tournament
 from discord.ext import commands
-from enum import Enum
-from collections import deque
 
 
-class GameStatus(Enum):
-    PENDING = 0
-    PREFLOP = 1
-    FLOP = 2
-    TURN = 3
-    RIVER = 4
-    ENDGAME = 5
+class GameDirector:
+    """
+    Discord side of a table: renders engine events as messages,
+    keeps turn deadline and writes balances changed during the hand.
 
-    def next(self):
-        return GameStatus(self.value + 1)
+    Engine calls and rendering of their events take the table's lock, so
+    actions, timeouts and AI seats of a table go one at a time in order
+    of arrival, while other tables go on meanwhile.
+    """
 
+    # Seconds of inactivity before player is removed from table
+    TURN_TIMEOUT = 90
+
+    ACTIONS = {
+        Action.RAISE: "Raise stake - k.raise <amount>",
+        Action.CALL: "Call to ${} - k.call",
+        Action.BET: "Bet money - k.bet <amount>",
+        Action.CHECK: "Check - k.check",
+        Action.ALLIN: "Go all-in - k.all-in",
+        Action.FOLD: "Fold - k.fold",
+    }
+
+    REJECTIONS = {
+        Rejection.NOT_TURN: "You can't make any actions!",
+        Rejection.AMOUNT: "Invalid amount.",
+        Rejection.CHECK: "You're not allowed to check.",
+        Rejection.CALL_FUNDS: "You don't have enough money to make call.",
+        Rejection.BET_FUNDS: "You don't have enough money to make bet.",
+        Rejection.BET_OPENED: "You can't use bet. Use \"k.raise\" to raise stake.",
+        Rejection.RAISE_FUNDS: "You don't have enough money to raise stake.",
+        Rejection.ALLIN_FUNDS: "You don't have money to go all in.",
+    }
+
+    AI_ACTIONS = {
+        Action.CHECK: "{} checks.",
+        Action.CALL: "{} calls.",
+        Action.BET: "{} bets ${}.",
+        Action.RAISE: "{} raises stake on ${}.",
+        Action.ALLIN: "{} goes all-in!",
+        Action.FOLD: "{} folds.",
+    }
+
+    def __init__(self, bot, db_funcs, player_index, scheduler, history, channel, seed=None):
+        self.channel = channel
+        self.bot = bot
+        self.db_funcs = db_funcs
+        # Shared by all games: user id -> (game, player)
+        self.player_index = player_index
+        # Shared by all games, turn deadline is kept under the game itself
+        self.scheduler = scheduler
+        # Shared by all games, finished hands are written there
+        self.history = history
+        self.engine = holdem.Game(seed)
+        # Seated players by user id
+        self.players_by_id = {}
+        # Players whose balance changed since the last write, by user id
+        self.pending_balances = {}
+        # Chips won minus chips staked during the hand, by user id
+        self.hand_profits = {}
+        # Players who left during the hand, they might still win, so they stay in the index until it ends
+        self.leavers = []
+        # Worker pool of AI seats' decisions, the loop's default executor if not set
+        self.ai_executor = None
+        # Engine calls and rendering of their events go one at a time
+        self.lock = asyncio.Lock()
+        # Number of the current turn, actions and timeouts of the previous ones are late
+        self.turn = 0
+        # Turn with an action waiting for the table, further actions of it are duplicates
+        self.queued = None
+        # Shared calculator of the live equity view, None while the view is off
+        self.equity = None
+        # Message of the view in the current hand, task updating it and (players, board) it has to show
+        self.equity_message = None
+        self.equity_task = None
+        self.equity_request = None
+        # Last task sending direct messages, the next one waits for it
+        self.dm_task = None
+        # Deletes the table once no people are seated at it, tournament tables are broken by the tournament
+        self.on_empty = None
+
+    @property
+    def players(self):
+        return self.engine.players
+
+    @property
+    def status(self):
+        return self.engine.status
+
+    @property
+    def table(self):
+        return self.engine.table
+
+    @property
+    def evaluator(self):
+        return self.engine.evaluator
+
+    # Players
+    def add_player(self, author: discord.Member, balance: int):
+
+        player = self.engine.add_player(author, balance)
+
+        self.players_by_id[player.id] = player
+        self.player_index[player.id] = (self, player)
 
-class PlayerStatus(Enum):
-    WAITING = 0
-    # For debug purposes
-    BLINDED = 1
-    CALLED = 2
-    CHECKED = 3
-    BET = 4
-    RAISED = 5
-    ALLIN = 6
-    THONKING = 7
-    FOLDED = 8
+    def get_player(self, author: discord.Member):
+        return self.players_by_id.get(author.id)
 
+    def discard_player(self, player: Player):
+        del self.players_by_id[player.id]
+        # Player might have joined other game already
+        if self.player_index.get(player.id, (None,))[0] is self:
+            del self.player_index[player.id]
 
-class Dealer:
+    async def remove_player(self, player: Player, turn=None):
+        """
+        This function is coroutine.
 
-    def __init__(self, table):
-        self.deck = deuces.Deck()
-        self.players = table.players
-        self.table = table
+        Returns False if player has left already, or if turn is given and it has passed.
+        """
+        async with self.lock:
+            if self.players_by_id.get(player.id) is not player or (turn is not None and not self.is_turn(player, turn)):
+                return False
 
-    def deal_cards(self):
-        for player in self.players:
-            player.hand.extend(self.deck.draw(2))
+            await self.drop_player(player)
+            return True
 
-    def place_cards(self):
-        if len(self.table.cards) >= 3:
-            self.table.cards.extend(self.deck.draw(1))
+    async def drop_player(self, player: Player):
+        # Table is locked
+        if self.status is GameStatus.PENDING:
+            self.discard_player(player)
         else:
-            self.table.cards.extend(self.deck.draw(3))
+            del self.players_by_id[player.id]
+            self.leavers.append(player)
 
+        # Save balance of leaving player right away, his stakes stay in the bank
+        if player.id in self.pending_balances:
+            await self.db_funcs.write_players_data([self.pending_balances.pop(player.id)])
 
-class Player:
-
-    def __init__(self, user, balance):
-        self.id = user.id
-        self.user = user
-        self.status = PlayerStatus.WAITING
-        self.hand = []
-        self.current_stake = 0
-        self.total_stake = 0
-        self.balance = balance
-        self.fold_position = 0
-
-    def add_balance(self, amount):
-        self.balance += amount
-
-    def withdraw_balance(self, amount):
-        self.balance -= amount
-
-    def set_status(self, status):
-        self.status = status
-
-    def set_current_stake(self, stake):
-        self.current_stake = stake
-
-    def set_total_stake(self, stake):
-        self.total_stake += stake
-
-    def set_fold_position(self, position):
-        self.fold_position = position
-
-    def __str__(self):
-        return str(self.user)
+        # If there are no players - the table will be destroyed
+        await self.render(self.engine.remove_player(player))
+        await self.close_if_unattended()
+
+    def release_leavers(self):
+        for player in self.leavers:
+            if self.player_index.get(player.id, (None, None))[1] is player:
+                del self.player_index[player.id]
+        self.leavers.clear()
+
+    def turn_timeout(self, player: Player, turn: int):
+        # Called by scheduler outside of any coroutine
+        self.bot.loop.create_task(self.remove_inactive_player(player, turn))
+
+    async def remove_inactive_player(self, player: Player, turn: int):
+        # Player might have acted while the timeout was waiting for the table
+        if await self.remove_player(player, turn):
+            await self.bot.send_message(self.channel, "{} has been removed from table due to inactivity".format(player.user.mention))
+
+    def balance_changed(self, player: Player, amount: int):
+        # AI seats have no account
+        if isinstance(player.user, ai.AIUser):
+            return
 
+        # Written to database at the end of hand
+        self.pending_balances[player.id] = player
+        self.hand_profits[player.id] = self.hand_profits.get(player.id, 0) + amount
 
-class Table:
+    def is_turn(self, player: Player, turn: int):
+        return self.turn == turn and self.status is not GameStatus.PENDING and player.status is PlayerStatus.THONKING
 
-    def __init__(self, players):
-        self.players = players
-        self.rotation = deque()
-        self.dealer = Dealer(self)
-        self.cards = []
-        self.bank = 0
+    def has_humans(self):
+        return any(not isinstance(player.user, ai.AIUser) for player in self.players)
 
-    def add_bank(self, amount):
-        self.bank += amount
+    async def close_if_unattended(self):
+        # Table is locked. AI seats don't stay at table without people
+        on_empty = self.on_empty
+        if on_empty is None or self.has_humans():
+            return
 
-    def withdraw_bank(self, amount):
-        self.bank -= amount
+        # Seats leaving below end the hand, it mustn't close the table again
+        self.on_empty = None
+        for player in list(self.players):
+            await self.drop_player(player)
 
-    def get_dealer(self):
-        return self.dealer
+        await self.flush_balances()
+        on_empty()
+        await self.bot.send_message(self.channel, "Table is empty! (╯°-°）╯︵ ┻━┻:fire:")
 
+    async def hand_finished(self):
+        """
+        This function is coroutine.
 
-class GameDirector:
+        Called once results of a hand are shown, table is locked. Cash tables
+        wait for "k.start", tournament tables report to their director here.
+        """
 
-    def __init__(self, bot, db_funcs, channel):
-        self.channel = channel
-        self.status = GameStatus.PENDING
-        self.bot = bot
-        self.db_funcs = db_funcs
-        self.table = None
-        self.turn_timer = None
-        self.pot_count = 0
-        self.players = []
-        self.round_highest_stake = 0
-        self.turn_counter = 0
-        self.fold_position = 0
-        self.evaluator = deuces.Evaluator()
+    async def flush_balances(self):
+        # Write all balances changed during the hand in one transaction, with hand won and profit counters
+        if self.pending_balances or self.hand_profits:
+            players = list(self.pending_balances.values())
+            results = [(int(profit > 0), profit, user_id) for user_id, profit in self.hand_profits.items()]
+            self.pending_balances.clear()
+            self.hand_profits.clear()
+            await self.db_funcs.write_players_data(players, results)
 
     # Game functions
-    def create_table(self):
-        self.table = Table(list(self.players))
+    def prepare_hand(self):
+        # Table is locked, returns False if hand can't start
+        return self.status is GameStatus.PENDING
 
-    def process_stake(self, player: Player, amount: int, stake: int, status: PlayerStatus):
+    async def start_hand(self):
+        async with self.lock:
+            # Hand might have been started while waiting for the table
+            if not self.prepare_hand():
+                return
 
-        print("-------------------------------")
-        print("{} {}".format(str(player), status.name))
-        print("Player balance: ${}".format(player.balance))
-        print("Amount to withdraw and add to bank: ${}".format(amount))
-        print("Player current stake: ${}".format(stake))
+            await self.render(self.engine.start_hand())
 
-        player.withdraw_balance(amount)
-        player.set_total_stake(amount)
-        self.table.add_bank(amount)
+            # Table is closed if the last people have busted
+            if self.status is GameStatus.PENDING and self.players:
+                await self.bot.send_message(self.channel, "There aren't enough players with at least ${} to start the game.".format(self.engine.min_balance))
 
-        self.db_funcs.write_player_data(player)
+    async def make_action(self, player: Player, action: Action, amount=0):
+        """
+        This function is coroutine.
 
-        player.set_current_stake(stake)
-        print("Player total stake: ${}".format(player.total_stake))
-        print("-------------------------------")
+        Queues action of the player, returns False if it's not his turn or he has acted already.
+        """
 
-        player.set_status(status)
+        # Late and duplicate actions are dropped before waiting for the table
+        turn = self.turn
+        if not self.is_turn(player, turn) or self.queued == turn:
+            return False
 
-    async def make_check(self, player: Player):
+        self.queued = turn
 
-        if player.balance != 0 and player.current_stake < self.round_highest_stake:
-            await self.bot.send_message(self.channel, "You're not allowed to check.")
-            return
+        async with self.lock:
+            self.queued = None
+            if not self.is_turn(player, turn):
+                return False
 
-        player.set_status(PlayerStatus.CHECKED)
+            await self.render(self.engine.act(player, action, amount))
+            return True
 
-        await self.get_next_player()
+    async def make_check(self, player: Player):
+        return await self.make_action(player, Action.CHECK)
 
     async def make_fold(self, player: Player):
+        return await self.make_action(player, Action.FOLD)
 
-        player.set_status(PlayerStatus.FOLDED)
-
-        # Used for detection in side pots distribution
-        self.fold_position += 1
-
-        player.set_fold_position(self.fold_position)
+    async def make_call(self, player: Player):
+        return await self.make_action(player, Action.CALL)
 
-        self.table.rotation.remove(player)
+    async def make_bet(self, player: Player, amount: int):
+        return await self.make_action(player, Action.BET, amount)
 
-        await self.get_next_player()
+    async def make_raise(self, player: Player, amount: int):
+        return await self.make_action(player, Action.RAISE, amount)
 
-    async def make_call(self, player: Player):
+    async def make_all_in(self, player: Player):
+        return await self.make_action(player, Action.ALLIN)
 
-        if self.round_highest_stake == 0:
-            await self.make_check(player)
-            return
+    async def play_ai(self, player: Player, turn: int):
 
-        if player.balance < self.round_highest_stake:
-            await self.bot.send_message(self.channel, "You don't have enough money to make call.")
+        # Turn might have passed before the task started
+        if not self.is_turn(player, turn):
             return
 
-        # Difference between stake to answer on and player's current stake
-        amount_difference = self.round_highest_stake - player.current_stake
-
-        self.process_stake(player, amount_difference, self.round_highest_stake, PlayerStatus.CALLED)
+        situation = ai.situation(self.engine, player)
 
-        await self.get_next_player()
+        try:
+            # Decisions take their CPU budget in a worker, so the loop keeps running
+            action, amount = await self.bot.loop.run_in_executor(self.ai_executor, ai.decide, situation, player.user.difficulty, None)
+        except Exception as e:
+            print("AI decision failed. Reason: {}".format(type(e).__name__))
+            action, amount = Action.FOLD, 0
+
+        async with self.lock:
+            # Hand might have ended or player left meanwhile
+            if not self.is_turn(player, turn):
+                return
+
+            await self.bot.send_message(self.channel, self.AI_ACTIONS[action].format(player.user.mention, amount))
+            await self.render(self.engine.act(player, action, amount))
+
+    # Live equity
+    def runout_players(self):
+        # Players in the pot once nobody can bet anymore, None while betting goes on
+        players = [player for player in self.table.players if player.status is not PlayerStatus.FOLDED]
+        bettors = [player for player in self.table.rotation if player.status is not PlayerStatus.FOLDED and player.balance > 0]
+
+        if len(players) < 2 or len(bettors) > 1:
+            return None
 
-    async def make_bet(self, player: Player, amount: int):
+        return players
 
-        if player.balance < amount:
-            await self.bot.send_message(self.channel, "You don't have enough money to make bet.")
-            return
-        elif self.round_highest_stake != 0:
-            await self.bot.send_message(self.channel, "You can't use bet. Use \"k.raise\" to raise stake.")
+    def show_equity(self, street: GameStatus, board: tuple):
+        players = self.runout_players()
+        if players is None:
             return
 
-        # Set initial round's highest stake
-        self.round_highest_stake = amount
+        self.equity_request = (players, [tuple(player.hand) for player in players], street, board)
 
-        self.process_stake(player, amount, amount, PlayerStatus.BET)
+        # One task per table, it takes the latest street once it's done with the current one
+        if self.equity_task is None or self.equity_task.done():
+            self.equity_task = self.bot.loop.create_task(self.update_equity())
 
-        await self.get_next_player()
+    async def update_equity(self):
 
-    async def make_raise(self, player: Player, amount: int):
-
-        # Raise ON amount more than round's highest stake
-        raise_amount = self.round_highest_stake + amount
+        while self.equity_request is not None:
+            players, hands, street, board = self.equity_request
+            self.equity_request = None
 
-        if player.balance + player.current_stake < raise_amount:
-            await self.bot.send_message(self.channel, "You don't have enough money to raise stake.")
-            return
+            try:
+                equities = await self.equity.showdown_async(hands, board)
+            except ValueError as e:
+                print("Live equity failed. Reason: {}".format(type(e).__name__))
+                return
 
-        # Raise is always higher than round's highest stake
-        self.round_highest_stake = raise_amount
+            lines = "".join("{}: **{:.1%}**\n".format(player, equity.equity) for player, equity in zip(players, equities))
+            content = "**Live equity** on the {}:\n{}".format(street.name.lower(), lines)
 
-        # Difference between raised amount and current stake
-        amount_difference = raise_amount - player.current_stake
+            try:
+                if self.equity_message is None:
+                    self.equity_message = await self.bot.send_message(self.channel, content)
+                else:
+                    await self.bot.edit_message(self.equity_message, content)
+            except discord.HTTPException as e:
+                print("Live equity failed. Reason: {}".format(type(e).__name__))
+                return
 
-        self.process_stake(player, amount_difference, raise_amount, PlayerStatus.RAISED)
+    def stop_equity(self):
+        # Computation of a torn down table or a finished hand isn't needed anymore
+        if self.equity_task is not None:
+            self.equity_task.cancel()
+            self.equity_task = None
+        self.equity_message = None
+        self.equity_request = None
 
-        await self.get_next_player()
+    def get_available_actions(self, actions: list, highest_stake: int):
+        return "".join(self.ACTIONS[action].format(highest_stake) + "\n" for action in actions)
 
-    async def make_all_in(self, player: Player):
+    async def get_table_info(self):
 
-        if player.balance == 0:
-            await self.bot.send_message(self.channel, "You don't have money to go all in.")
-            return
+        embeded = discord.Embed(title='Table Info', description="Channel: {}".format(self.channel.name), color=0xEE8700)
+        embeded.add_field(name="Total players:", value="{}/10".format(str(len(self.players))), inline=True)
+        embeded.add_field(name="Game status:", value=self.status.name, inline=False)
+        if self.table is not None:
+            embeded.add_field(name="Table bank:", value="${}".format(self.table.bank), inline=False)
+        time_left = self.scheduler.remaining(self)
+        if time_left is not None:
+            embeded.add_field(name="Turn time left:", value="{} seconds".format(int(time_left)), inline=False)
+        for player in self.players:
+            embeded.add_field(name=str(player), value="Balance: ${}\nStatus: {}".format(player.balance, player.status.name), inline=True)
 
-        # Player's stake in current round must be sum of player's balance and his current stake
-        player_stake = player.balance + player.current_stake
+        await self.bot.send_message(self.channel, embed=embeded)
 
-        # If this stake is higher than round's highest stake - set new round's highest stake
-        if player_stake > self.round_highest_stake:
-            self.round_highest_stake = player_stake
+    def send_direct_messages(self, messages: list):
+        # Own task, so the hand goes on while messages wait for rate limits
+        messages = [(user, content) for user, content in messages if not isinstance(user, ai.AIUser)]
+        if messages:
+            self.dm_task = self.bot.loop.create_task(self.deliver_direct_messages(messages, self.dm_task))
 
-        self.process_stake(player, player.balance, player_stake, PlayerStatus.ALLIN)
+    async def deliver_direct_messages(self, messages: list, previous):
+        # Messages of the previous street go first
+        if previous is not None:
+            await asyncio.wait([previous])
 
-        await self.get_next_player()
+        # All players get their messages at once, those who can't are told in channel
+        failed = await utils.send_messages(self.bot, messages)
 
-    def take_blind(self, players):
+        if failed:
+            mentions = ", ".join(user.mention for user, _ in failed)
+            try:
+                await self.bot.send_message(self.channel, "I can't send direct messages to {}. "
+                                                          "Please, allow direct messages from server members.".format(mentions))
+            except discord.HTTPException as e:
+                print("Failed to report direct messages. Reason: {}".format(type(e).__name__))
 
-        SMALL_BLIND = 20
-        BIG_BLIND = SMALL_BLIND + 20
+    # Events
+    async def render(self, events: list):
 
-        self.round_highest_stake = BIG_BLIND
+        # Turns are numbered before anything is sent, so actions of the previous ones are late right away
+        self.turn += sum(1 for event in events if event.type is EventType.TURN)
 
-        self.process_stake(players[0], SMALL_BLIND, SMALL_BLIND, PlayerStatus.BLINDED)
-        self.process_stake(players[1], BIG_BLIND, BIG_BLIND, PlayerStatus.BLINDED)
+        # Pots are shown in one message at the end of hand
+        results = []
+        # Last people might have busted or the hand they left might have ended
+        seats_released = False
 
-        self.db_funcs.write_player_data(players[0])
-        self.db_funcs.write_player_data(players[1])
+        for event in events:
 
-    def check_players(self):
+            if event.type is EventType.BUSTED:
+                self.discard_player(event.player)
+                seats_released = True
 
-        # Check if player has balance lower than $100 and remove him from the game
-        for player in self.table.players:
-            if player.balance < 100:
-                self.players.remove(player)
-                self.table.players.remove(player)
+            elif event.type is EventType.STAKE:
+                status, balance, stake, total_stake = event.info
+                print("-------------------------------")
+                print("{} {}".format(str(event.player), status.name))
+                print("Player balance: ${}".format(balance))
+                print("Amount to withdraw and add to bank: ${}".format(event.amount))
+                print("Player current stake: ${}".format(stake))
+                print("Player total stake: ${}".format(total_stake))
+                print("-------------------------------")
 
-        self.take_blind(self.table.players)
+                self.balance_changed(event.player, -event.amount)
 
-        # Deal cards
-        self.table.dealer.deal_cards()
-        # Set rotation
-        self.table.rotation = deque(self.table.players)
+            elif event.type is EventType.PAYOUT:
+                self.balance_changed(event.player, event.amount)
 
-    def add_player(self, author: discord.Member):
+            elif event.type is EventType.REJECTED:
+                await self.bot.send_message(self.channel, self.REJECTIONS[event.info])
 
-        balance = self.db_funcs.load_player_data(author)[3]
+            elif event.type is EventType.DEALT:
+                # New hand gets a new live equity message
+                self.stop_equity()
 
-        player = Player(author, balance)
+                messages = []
+                for player, hand in event.info:
+                    cards = [deuces.Card.int_to_pretty_str(card) for card in hand]
+                    messages.append((player.user, "Your cards are: {}".format(" and ".join(cards))))
 
-        self.players.append(player)
+                self.send_direct_messages(messages)
 
-    def get_player(self, author: discord.Member):
-        for player in self.players:
-            if author.id == player.id:
-                return player
+                await self.bot.send_message(self.channel, "Setting up the table and starting the game!\n")
 
-        return None
+            elif event.type is EventType.TURN:
+                # Set turn timer
+                self.scheduler.arm(self, self.TURN_TIMEOUT, self.turn_timeout, event.player, self.turn)
 
-    async def remove_player(self, player: Player):
+                # Own task, so a table of AI seats doesn't play the whole hand inside this call
+                if isinstance(event.player.user, ai.AIUser):
+                    self.bot.loop.create_task(self.play_ai(event.player, self.turn))
+                    continue
 
-        # If there are no players - the table will be destroyed
-        self.players.remove(player)
+                actions = self.get_available_actions(*event.info)
 
-        # Variables are uninitialized if game is not in process
-        if self.status is not GameStatus.PENDING:
-            # Remove player from rotation, but let him be in table, since we need him in pots calculations
-            self.table.rotation.remove(player)
-            # If rotation contains only 1 player - get last player and end the game.
-            if player.status is PlayerStatus.THONKING or len(self.table.rotation) == 1:
-                player.set_status(PlayerStatus.FOLDED)
-                await self.get_next_player()
+                await self.bot.send_message(self.channel, "{}'s turn.\n\n"
+                                                          "**Available actions:**\n{}\n"
+                                                          "Current table bank is: ${}".format(event.player.user.mention, actions, event.amount))
 
-    def give_money(self, player: Player, amount: int):
-        # Take money from the table bank
-        self.table.withdraw_bank(amount)
-        # Give them to player
-        player.add_balance(amount)
+            elif event.type is EventType.STREET:
+                street, table_cards, ranks = event.info
 
-        self.db_funcs.write_player_data(player)
+                # Let players know about their current combination
+                messages = []
+                for player, rank in ranks:
+                    rank_class = self.evaluator.get_rank_class(rank)
+                    class_string = self.evaluator.class_to_string(rank_class)
+                    messages.append((player.user, "Current combination: **{}**".format(class_string)))
 
-    def set_status(self, status: GameStatus):
-        self.status = status
+                self.send_direct_messages(messages)
 
-    async def turn_timer_task(self, player: Player):
-        try:
-            # 20 seconds of inactivity
-            while self.turn_counter < 90:
-                self.turn_counter += 1
-                await asyncio.sleep(1)
-            else:
-                # Don't forget to reset counter
-                self.turn_counter = 0
-                await self.remove_player(player)
-                await self.bot.send_message(self.channel, "{} has been removed from table due to inactivity".format(player.user.mention))
-        except asyncio.CancelledError:
-            # And after task cancelling too
-            self.turn_counter = 0
+                cards = [deuces.Card.int_to_pretty_str(card) for card in table_cards]
 
-    async def get_table_info(self):
+                await self.bot.send_message(self.channel, "Cards on table:\n{}".format("\n".join(cards)))
 
-        embeded = discord.Embed(title='Table Info', description="Channel: {}".format(self.channel.name), color=0xEE8700)
-        embeded.add_field(name="Total players:", value="{}/10".format(str(len(self.players))), inline=True)
-        embeded.add_field(name="Game status:", value=self.status.name, inline=False)
-        if self.table is not None:
-            embeded.add_field(name="Table bank:", value="${}".format(self.table.bank), inline=False)
-        for player in self.players:
-            embeded.add_field(name=str(player), value="Balance: ${}\nStatus: {}".format(player.balance, player.status.name), inline=True)
+                # Table is gone if the same events ended the hand
+                if self.equity is not None and self.table is not None:
+                    self.show_equity(street, table_cards)
 
-        await self.bot.send_message(self.channel, embed=embeded)
+            elif event.type is EventType.POT:
+                pot_number, winners, rank = event.info
 
-    def get_available_actions(self, player: Player):
-        msg = ""
-
-        if player.balance >= self.round_highest_stake != 0:
-            msg += "Raise stake - k.raise <amount>\n"
-            msg += "Call to ${} - k.call\n".format(self.round_highest_stake)
-            msg += "Go all-in - k.all-in\n"
-            msg += "Fold - k.fold\n"
-        elif player.balance > self.round_highest_stake == 0:
-            msg += "Bet money - k.bet <amount>\n"
-            msg += "Check - k.check\n"
-            msg += "Go all-in - k.all-in\n"
-            msg += "Fold - k.fold\n"
-        elif player.balance == 0:
-            msg += "Check - k.check\n"
-            msg += "Fold - k.fold\n"
-        elif player.balance < self.round_highest_stake:
-            msg += "Go all-in - k.all-in\n"
-            msg += "Fold - k.fold\n"
-
-        return msg
-
-    async def get_next_player(self):
-
-        # Cancel timer
-        if self.turn_timer is not None:
-            self.turn_timer.cancel()
-
-        # Get next round
-        await self.get_next_round(self.table.rotation)
-
-        # Avoid errors after setting GameStatus to PENDING
-        if self.status is GameStatus.PENDING:
-            return
+                str_pot = "main pot with amount of ${}".format(event.amount) if pot_number == 0 else "side pot {} with amount of ${}".format(pot_number, event.amount)
 
-        # Move out player
-        player = self.table.rotation.popleft()
+                rank_class = self.evaluator.get_rank_class(rank)
+                class_string = self.evaluator.class_to_string(rank_class)
 
-        # Put him in the end of rotation
-        self.table.rotation.append(player)
+                if len(winners) == 1:
+                    results.append("Player {} wins {} with {}.\n".format(winners[0].user.mention, str_pot, class_string))
+                else:
+                    results.append("Players {} are tied for {} with {}.\n".format(", ".join(map(str, winners)), str_pot, class_string))
 
-        # Set turn timer
-        self.turn_timer = self.bot.loop.create_task(self.turn_timer_task(player))
+            elif event.type is EventType.RETURNED:
+                results.append("${} were returned to {}\n".format(event.amount, event.player.user.mention))
 
-        # Set player status
-        player.set_status(PlayerStatus.THONKING)
+            elif event.type is EventType.RECORD:
+                self.history.write(event.info)
 
-        actions = self.get_available_actions(player)
+            elif event.type is EventType.HAND_END:
+                seats_released = True
 
-        await self.bot.send_message(self.channel, "{}'s turn.\n\n"
-                                                  "**Available actions:**\n{}\n"
-                                                  "Current table bank is: ${}".format(player.user.mention, actions, self.table.bank))
+                # Cancel timer
+                self.scheduler.cancel(self)
 
-    async def set_next_round(self, status: GameStatus):
+                # Equity of the last street mustn't show up after the results
+                self.stop_equity()
 
-        self.table.get_dealer().place_cards()
+                # Save balances
+                await self.flush_balances()
+                self.release_leavers()
 
-        for player in self.table.rotation:
-            # Reset states and nullify current stakes
-            player.set_status(PlayerStatus.WAITING)
-            player.current_stake = 0
-            self.round_highest_stake = 0
+                if event.player is not None:
+                    await self.bot.send_message(self.channel, "As the last man standing, {} wins and gets the bank!\n"
+                                                              "Type \"k.start\" to start game again.".format(event.player.user.mention))
+                    await self.hand_finished()
+                    continue
 
-            # Evaluate player's hand and let him know about his current combination
-            rank = self.evaluator.evaluate(player.hand, self.table.cards)
-            rank_class = self.evaluator.get_rank_class(rank)
-            class_string = self.evaluator.class_to_string(rank_class)
+                # Collect players' hands and compile message
+                players_cards = ""
+                for player, hand in event.info:
+                    cards = [deuces.Card.int_to_pretty_str(card) for card in hand]
+                    players_cards += "{}'s hand: {}\n".format(player, " and ".join(cards))
 
-            await self.bot.send_message(player.user, "Current combination: **{}**".format(class_string))
+                await self.bot.send_message(self.channel, "{}\n"
+                                                          "**Players' hands:**\n{}\n"
+                                                          "End of game. Type \"k.start\" to start the game again.".format("".join(results), players_cards))
+                await self.hand_finished()
 
-        self.set_status(status)
+        if seats_released:
+            await self.close_if_unattended()
 
-        cards = [deuces.Card.int_to_pretty_str(card) for card in self.table.cards]
 
-        await self.bot.send_message(self.channel, "Cards on table:\n{}".format("\n".join(cards)))
+class TournamentTable(GameDirector):
+    """
+    Table of a tournament. Chips aren't money, so nothing is written to database,
+    hands start on their own and players are moved between tables after them.
+    """
 
-    def reset_game(self):
-        # Reset status
-        self.set_status(GameStatus.PENDING)
+    # Seconds between hands
+    HAND_DELAY = 15
 
-        # Reset statuses, stakes and hands
-        for player in self.players:
-            player.set_status(PlayerStatus.WAITING)
-            player.hand = []
-            player.current_stake = 0
-            player.total_stake = 0
-            player.fold_position = 0
+    def __init__(self, bot, db_funcs, player_index, scheduler, history, channel, director, number, seed=None):
+        super().__init__(bot, db_funcs, player_index, scheduler, history, channel, seed)
+        self.director = director
+        self.number = number
+        # Players are out once they have no chips
+        self.engine.min_balance = 1
 
-        # Nullify timer task
-        self.turn_timer = None
+    def balance_changed(self, player: Player, amount: int):
+        pass
 
-        # Reset initial highest stake
-        self.round_highest_stake = 0
+    async def drop_player(self, player: Player):
+        # Out of the tournament before his leaving might finish the hand
+        await self.director.eliminate(player)
 
-        # Reset pot count
-        self.pot_count = 0
+        is_pending = self.status is GameStatus.PENDING
 
-        # Reset fold position
-        self.fold_position = 0
+        await super().drop_player(player)
 
-        # Burn the table
-        self.table = None
+        # Otherwise the end of hand takes care of the table
+        if is_pending:
+            await self.director.hand_finished(self)
 
-    def find_winners(self, players: list, pot: int):
+    async def hand_finished(self):
+        await self.director.hand_finished(self)
 
-        winners = []
+    def schedule_hand(self):
+        # Turn deadline and hand delay never overlap, so both are kept under the table
+        if self.status is GameStatus.PENDING and len(self.players) > 1 and self.scheduler.remaining(self) is None:
+            self.scheduler.arm(self, self.HAND_DELAY, self.hand_timeout)
 
-        # NOTE: Lower value - higher rank
-        best_rank = 7463  # Set rank lower than lowest possible hand (7462)
+    def hand_timeout(self):
+        # Called by scheduler outside of any coroutine
+        self.bot.loop.create_task(self.start_hand())
 
-        str_pot = "main pot with amount of ${}".format(pot) if self.pot_count == 0 else "side pot {} with amount of ${}".format(self.pot_count, pot)
+    def prepare_hand(self):
+        # Table might have been broken or filled up while waiting
+        if not super().prepare_hand() or len(self.players) < 2:
+            return False
 
-        for player in players:
+        self.engine.small_blind, self.engine.big_blind = self.director.tournament.blinds
 
-            if player.status is PlayerStatus.FOLDED:
-                continue
+        # Blinds move around the table
+        self.players.append(self.players.pop(0))
+        return True
 
-            rank = self.evaluator.evaluate(player.hand, self.table.cards)
 
-            # Detect winner
-            if rank == best_rank:
-                winners.append(player)
-                best_rank = rank
-            elif rank < best_rank:
-                winners = [player]
-                best_rank = rank
+class TournamentDirector:
+    """
+    Discord side of a tournament: registration in the lobby channel, one table
+    per channel and the blind clock. Tables and the clock share the cog's
+    scheduler, so there's no timer or task per table.
+    """
 
-        rank_class = self.evaluator.get_rank_class(best_rank)
-        class_string = self.evaluator.class_to_string(rank_class)
+    def __init__(self, cog, server, lobby, host, starting_stack, level_minutes):
+        self.cog = cog
+        self.bot = cog.bot
+        self.server = server
+        self.lobby = lobby
+        self.host = host
+        self.level_duration = level_minutes * 60
+        self.tournament = Tournament(starting_stack, table_size=9)
+        # Registered members by user id
+        self.members = {}
+        # Channels offered for tables and tables in play by number
+        self.channels = []
+        self.tables = []
+        self.over = False
+
+    async def start(self):
+        seating = self.tournament.seat()
+
+        for number, user_ids in enumerate(seating):
+            channel = self.channels[number]
+            table = TournamentTable(self.bot, self.cog.db_funcs, self.cog.player_index, self.cog.scheduler,
+                                    self.cog.history, channel, self, number)
+            for user_id in user_ids:
+                table.add_player(self.members[user_id], self.tournament.starting_stack)
+
+            self.tables.append(table)
+            self.cog.games[self.server.id][channel.id] = table
+
+        self.cog.scheduler.arm(self, self.level_duration, self.level_timeout)
+
+        for table in self.tables:
+            await self.bot.send_message(table.channel, "Tournament table {} is ready: {}.\n"
+                                                       "First hand starts in {} seconds!".format(
+                                                           table.number + 1, ", ".join(player.user.mention for player in table.players),
+                                                           TournamentTable.HAND_DELAY))
+            table.schedule_hand()
+
+    def level_timeout(self):
+        # Called by scheduler outside of any coroutine
+        small_blind, big_blind = self.tournament.raise_level()
+        self.cog.scheduler.arm(self, self.level_duration, self.level_timeout)
+        self.bot.loop.create_task(self.bot.send_message(self.lobby, "Blinds are up to ${}/${}!".format(small_blind, big_blind)))
+
+    async def eliminate(self, player: Player):
+        place = self.tournament.eliminate(player.id)
+        await self.bot.send_message(self.lobby, "{} finished the tournament in place {}.".format(player.user.mention, place))
+
+    async def hand_finished(self, table: TournamentTable):
+
+        for player in [player for player in table.players if player.balance == 0]:
+            table.discard_player(player)
+            table.engine.remove_player(player)
+            await self.eliminate(player)
+
+        if self.over:
+            return
+        elif self.tournament.remaining <= 1:
+            await self.finish()
+            return
 
-        if len(winners) == 1:
-            msg = "Player {} wins {} with {}.\n".format(winners[0].user.mention, str_pot, class_string)
-            # Give pot to winner
-            self.give_money(winners[0], pot)
+        # Moves are made without waiting for anything, so no table starts a hand in between.
+        # Tables busy with something else, like a player leaving, keep their players this time.
+        idle = [other.number for other in self.tables
+                if other.status is GameStatus.PENDING and (other is table or not other.lock.locked())]
+        moved = [self.move_player(self.tables[source], self.tables[destination])
+                 for source, destination in self.tournament.plan_moves(table.number, idle)]
+
+        broken = []
+        for other in self.tables:
+            if other.players:
+                other.schedule_hand()
+            elif other.channel.id in self.cog.games[self.server.id]:
+                self.cog.remove_game(self.server, other.channel)
+                broken.append(other)
+
+        for player, destination in moved:
+            await self.bot.send_message(destination.channel, "{} has been moved to this table.".format(player.user.mention))
+        for other in broken:
+            await self.bot.send_message(other.channel, "Table is broken, its players have been moved to other tables.")
+
+    def move_player(self, source: TournamentTable, destination: TournamentTable):
+        # The last seat would post blinds last
+        player = source.players[-1]
+
+        source.discard_player(player)
+        source.engine.remove_player(player)
+        destination.add_player(player.user, player.balance)
+        self.tournament.move(player.id, destination.number)
+
+        return player, destination
+
+    async def finish(self):
+        self.over = True
+        self.cog.scheduler.cancel(self)
+
+        winner = None
+        if self.tournament.remaining == 1:
+            winner = self.members[self.tournament.finish()]
+
+        for table in self.tables:
+            if table.channel.id in self.cog.games[self.server.id]:
+                self.cog.remove_game(self.server, table.channel)
+
+        del self.cog.tournaments[self.server.id]
+
+        if winner is not None:
+            await self.bot.send_message(self.lobby, "{} wins the tournament! :trophy:".format(winner.mention))
+        else:
+            await self.bot.send_message(self.lobby, "Tournament is over.")
+
+    async def get_info(self):
+
+        small_blind, big_blind = self.tournament.blinds
+
+        embeded = discord.Embed(title='Tournament Info', description="Lobby: {}".format(self.lobby.name), color=0xEE8700)
+        embeded.add_field(name="Blinds:", value="${}/${}".format(small_blind, big_blind), inline=True)
+        time_left = self.cog.scheduler.remaining(self)
+        if time_left is not None:
+            embeded.add_field(name="Next level in:", value="{} seconds".format(int(time_left)), inline=True)
+        if self.tournament.started:
+            embeded.add_field(name="Players left:", value="{}/{}".format(self.tournament.remaining, len(self.tournament.ids)), inline=False)
+            for table in self.tables:
+                if table.players:
+                    embeded.add_field(name="Table {}".format(table.number + 1),
+                                      value="{}, {} players".format(table.channel.mention, len(table.players)), inline=True)
         else:
-            msg = "Players {} are tied for {} with {}.\n".format(", ".join(map(str, winners)), str_pot, class_string)
-            # Return winners' stakes + win amount
-            for winner in winners:
-                win_amount = pot // len(winners)
-                self.give_money(winner, winner.total_stake + win_amount)
-        self.pot_count += 1
+            embeded.add_field(name="Registered:", value=str(len(self.tournament.ids)), inline=False)
+            embeded.add_field(name="Table channels:", value=str(len(self.channels)), inline=False)
 
-        return msg
+        await self.bot.send_message(self.lobby, embed=embeded)
 
-    def calculate_pots(self, players: list):
 
-        if len(players) == 1:
-            self.give_money(players[0], players[0].total_stake)
-            if players[0].total_stake == 0:
-                return "\n"
-            else:
-                return "${} were returned to {}\n".format(players[0].total_stake, players[0].user.mention)
+class BalanceJournal:
+    """
+    Append-only journal of poker balances.
+
+    Balances changed during a hand are appended as one line with a sequence
+    number and synced to disk before they're written to database. That's
+    the only sync of a hand, database commits aren't synced until the next
+    checkpoint. Database keeps sequence number of the last written entry
+    (poker_journal table) in the same transaction, so entries which didn't
+    make it to database disk before a crash are replayed on startup and
+    nothing is applied twice. Entries are dropped only after a checkpoint.
+    Entry whose transaction fails is cut off the journal again.
+    """
 
-        lowest_stake = players[0].total_stake
+    # Committed entries are dropped once journal grows bigger than this
+    MAX_SIZE = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+
+    def append(self, seq, records, results):
+        self.file.write(json.dumps({"seq": seq, "balances": records, "results": results}) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def entries(self):
+        with open(self.path) as f:
+            for line in f:
+                # Last line might be incomplete after a crash
+                if not line.endswith("\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                # Entries written before hand results were counted have none
+                yield entry["seq"], [tuple(record) for record in entry["balances"]], [tuple(result) for result in entry.get("results", [])]
+
+    def truncate(self, size=0):
+        self.file.seek(size)
+        self.file.truncate()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def size(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class Leaderboard:
+    """
+    Accounts with the highest balances, best first.
 
-        pot = lowest_stake * len(players)
+    Kept in memory and updated by every balance write, so leaderboard
+    pages don't sort the accounts table. Every account which isn't kept
+    has at most floor balance, so an account whose balance drops below
+    it is dropped and one whose balance gets above it is added. Once
+    it's not sure about that anymore, it's loaded from database again.
+    """
 
-        msg = self.find_winners(players, pot)
+    # Accounts loaded from database, up to twice as many are kept
+    SIZE = 100
+
+    def __init__(self):
+        # (-balance, user id), sorted
+        self.entries = []
+        # User id -> (balance, name) of kept accounts
+        self.accounts = {}
+        self.floor = 0
+        # Whether all accounts are kept
+        self.complete = False
+        self.loaded = False
+        # Bumped by changes which can't be applied, loads started before them are outdated
+        self.version = 0
+        # Loads in progress and balances written meanwhile by user id
+        self.loads = 0
+        self.changes = {}
+
+    def begin_load(self):
+        self.loads += 1
+        return self.version
+
+    def finish_load(self, version, rows):
+        """
+        Takes rows of (user id, name, balance) with the highest balances, best first.
+        """
+        self.loads -= 1
+        changes = self.changes
+        if not self.loads:
+            self.changes = {}
 
-        for player in players:
-            player.total_stake -= lowest_stake
+        if rows is None or version != self.version:
+            return
 
-        del players[0]
+        # Order of equal balances is up to database
+        self.entries = sorted((-balance, user_id) for user_id, _, balance in rows)
+        self.accounts = {user_id: (balance, name) for user_id, name, balance in rows}
+        self.complete = len(rows) < self.SIZE
+        self.floor = rows[-1][2] if rows else 0
+        self.loaded = True
+
+        # Database might have been read before these were written
+        for user_id, (name, balance) in changes.items():
+            self.update(user_id, name, balance)
+
+    def update(self, user_id, name, balance):
+        if self.loads:
+            self.changes[user_id] = (name, balance)
+        if not self.loaded:
+            return
 
-        return msg
+        kept = self.accounts.pop(user_id, None)
+        if kept is not None:
+            del self.entries[bisect.bisect_left(self.entries, (-kept[0], user_id))]
 
-    async def get_next_round(self, rotation: deque):
+        if self.complete or balance > self.floor:
+            bisect.insort(self.entries, (-balance, user_id))
+            self.accounts[user_id] = (balance, name)
 
-        # Before we check for next round we need to make sure it's necessary
-        if len(rotation) == 1:
-            last_player = rotation.popleft()
-            self.give_money(last_player, self.table.bank)
+        if len(self.entries) > 2 * self.SIZE:
+            # Keep floor above dropped accounts
+            for _, dropped in self.entries[self.SIZE:]:
+                del self.accounts[dropped]
+            self.floor = max(self.floor, -self.entries[self.SIZE][0])
+            del self.entries[self.SIZE:]
+            self.complete = False
 
-            # Reset game
-            self.reset_game()
+    def invalidate(self):
+        # Balance changed by an unknown amount
+        self.version += 1
+        self.loaded = False
 
-            await self.bot.send_message(self.channel, "As the last man standing, {} wins and gets the bank!\n"
-                                                      "Type \"k.start\" to start game again.".format(last_player.user.mention))
-            return
+    def page(self, offset, count, user_ids=None):
+        """
+        Returns (user id, name, balance) of accounts on the page, only those of user_ids if given.
+        None if it can't tell, then the page is read from database.
+        """
+        if not self.loaded:
+            return None
 
-        is_new_round = True
+        rows = []
+        for balance, user_id in self.entries:
+            if user_ids is None or user_id in user_ids:
+                rows.append((user_id, self.accounts[user_id][1], -balance))
+                if len(rows) == offset + count:
+                    break
 
-        for player in rotation:
-            # We need to check if all stakes are equal to the highest one.
-            # Except the case when player went all-in.
-            if player.current_stake < self.round_highest_stake and player.balance != 0:
-                player.set_status(PlayerStatus.WAITING)
+        if len(rows) < offset + count and not self.complete:
+            return None
 
-            # And if we found player who is waiting and has non-zero balance - continue current round.
-            if player.status is PlayerStatus.WAITING:
-                is_new_round = False
-                break
+        return rows[offset:]
 
-        # If all players made their moves - proceed to next round
-        if is_new_round:
 
-            # Get next status
-            next_status = self.status.next()
+class DBFunctions:
+    """
+    Poker queries. Everything runs through the database gateway,
+    so none of these block the event loop.
 
-            # Set it if it's not end of the game
-            if next_status is not GameStatus.ENDGAME:
-                await self.set_next_round(next_status)
-            else:
-                # Update game status
-                self.set_status(GameStatus.PENDING)
+    Accounts are kept in a bounded LRU cache by user id. Every write
+    updates the cache before it's queued, so a warm account costs no
+    queries, and a cold one is loaded once however many commands ask for it.
+    """
 
-                # Sort players by total stakes
-                compare = attrgetter("total_stake")
-                players = list(self.table.players)
-                players.sort(key=compare, reverse=False)
+    # Accounts kept in memory
+    MAX_ACCOUNTS = 10000
 
-                # Calculate pots and distribute money
-                msg = [self.calculate_pots(players) for _ in range(len(self.table.players))]
+    def __init__(self, db, journal_path='poker_journal.log'):
+        self.db = db
+        self.journal = BalanceJournal(journal_path)
+        # Only used in the writer thread
+        self.journal_seq = 0
+        self.replayed = False
+
+        # User id -> account row, least recently used first
+        self.accounts = OrderedDict()
+        # User id -> future of account being loaded
+        self.loading = {}
+        # Accounts written while being loaded, loaded rows of them are outdated
+        self.stale = set()
+        self.leaderboard = Leaderboard()
+
+        # Queued before any other poker write, so nothing is written on top of missing entries.
+        # If it fails, journaled writes retry it and fail as well until it's done
+        self.replay = self.db.submit(self.replay_journal)
+        self.db.submit(self.compact_journal)
+
+    # Run in the writer thread
+    def get_journal_seq(self, db):
+        row = db.execute("SELECT last_seq FROM poker_journal WHERE id=1").fetchone()
+        return row[0] if row else 0
+
+    def replay_journal(self, db):
+        """
+        Writes journal entries missing in database.
+        """
+        last_seq = self.get_journal_seq(db)
+        entries = list(self.journal.entries())
 
-                # Collect players' hands and compile message
-                players_cards = ""
-                for player in rotation:
+        try:
+            for seq, records, results in entries:
+                if seq > last_seq:
+                    print("Replaying poker balances entry {}".format(seq))
+                    self.write_results(db, records, results)
+                    db.execute("INSERT OR REPLACE INTO poker_journal(id, last_seq) VALUES (1, ?)", (seq,))
+            db.commit()
+        except sqlite3.Error as e:
+            print("Failed to replay poker balances journal. Reason: {}".format(type(e).__name__))
+            raise
 
-                    if player.status is PlayerStatus.FOLDED:
-                        continue
+        # New entries are numbered after the written ones
+        self.journal_seq = max([last_seq] + [seq for seq, _, _ in entries])
+        self.replayed = True
 
-                    cards = [deuces.Card.int_to_pretty_str(card) for card in player.hand]
-                    players_cards += "{}'s hand: {}\n".format(player, " and ".join(cards))
+    def compact_journal(self, db):
+        # Drop the journal once all its entries are in database and synced to disk
+        last_seq = self.get_journal_seq(db)
+        if all(seq <= last_seq for seq, _, _ in self.journal.entries()) and Database.checkpoint(db):
+            self.journal.truncate()
 
-                # Reset game
-                self.reset_game()
+    def close_journal(self, db):
+        self.compact_journal(db)
+        self.journal.close()
 
-                await self.bot.send_message(self.channel, "{}\n"
-                                                          "**Players' hands:**\n{}\n"
-                                                          "End of game. Type \"k.start\" to start the game again.".format("".join(msg), players_cards))
+    def write_results(self, db, records, results):
+        db.executemany("UPDATE poker_players SET name=?, balance=? WHERE user_id=?", records)
+        db.executemany("UPDATE poker_players SET win_count=win_count + ?, profit=profit + ? WHERE user_id=?", results)
 
+    def write_journaled(self, db, records, results):
+        # Nothing is numbered or written on top of entries which are still missing in database
+        if not self.replayed:
+            self.replay_journal(db)
 
-class DBFunctions:
+        if self.journal.size() > BalanceJournal.MAX_SIZE:
+            self.compact_journal(db)
 
-    def __init__(self, db):
-        self.db = db
+        offset = self.journal.size()
+        self.journal_seq += 1
+        self.journal.append(self.journal_seq, records, results)
 
-    def add_player(self, player: discord.Member):
         try:
-            # User ID, name, balance, win count
-            record = (player.id, str(player), 5000, 0)
-            self.db.execute("INSERT INTO poker_players(user_id, name, balance, win_count) VALUES (?,?,?,?)", record)
-            self.db.commit()
-        except sqlite3.Error as e:
-            print(type(e).__name__)
+            self.write_results(db, records, results)
+            db.execute("INSERT OR REPLACE INTO poker_journal(id, last_seq) VALUES (1, ?)", (self.journal_seq,))
+            db.commit()
+        except BaseException:
+            # Entry that didn't make it mustn't be replayed over later writes
+            self.journal.truncate(offset)
+            self.journal_seq -= 1
+            raise
+
+    def load_account(self, db, user_id, name):
+        row = db.execute("SELECT * FROM poker_players WHERE user_id=?", (user_id,)).fetchone()
+        if row is not None:
+            return list(row)
+
+        # User ID, name, balance, win count, profit
+        cursor = db.execute("INSERT INTO poker_players(user_id, name, balance, win_count, profit) VALUES (?,?,?,?,?)", (user_id, name, 5000, 0, 0))
+        return [cursor.lastrowid, user_id, name, 5000, 0, None, 0]
+
+    def top_accounts(self, db, count):
+        # Balance index gives accounts in order, so only as many as needed are read
+        return db.execute("SELECT user_id, name, balance FROM poker_players ORDER BY balance DESC LIMIT ?", (count,)).fetchall()
+
+    # Cache
+    def update_account(self, user_id, name, balance, next_claim_time=None):
+        self.leaderboard.update(user_id, name, balance)
+
+        row = self.accounts.get(user_id)
+        if row is not None:
+            row[2] = name
+            row[3] = balance
+            if next_claim_time is not None:
+                row[5] = next_claim_time
+        elif user_id in self.loading:
+            self.stale.add(user_id)
+
+    def add_to_account(self, user_id, amount, next_claim_time=None):
+        # Applied once the change is committed, so changes in place keep any order
+        row = self.accounts.get(user_id)
+        if row is not None:
+            row[3] += amount
+            if next_claim_time is not None:
+                row[5] = next_claim_time
+            self.leaderboard.update(user_id, row[2], row[3])
+        else:
+            self.leaderboard.invalidate()
+            if user_id in self.loading:
+                self.stale.add(user_id)
+
+    def add_results(self, results):
+        for won, profit, user_id in results:
+            row = self.accounts.get(user_id)
+            if row is not None:
+                row[4] += won
+                row[6] += profit
+            elif user_id in self.loading:
+                self.stale.add(user_id)
+
+    def invalidate(self, user_ids):
+        # Next load reads database again
+        self.leaderboard.invalidate()
+        for user_id in user_ids:
+            self.accounts.pop(user_id, None)
+            if user_id in self.loading:
+                self.stale.add(user_id)
+
+    def close(self):
+        """
+        Queues journal to be compacted and closed after the writes queued so far.
+        """
+        self.db.submit(self.close_journal)
+
+    # Coroutines
+    async def write_players_data(self, players: list, results=()):
+        """
+        This function is coroutine.
+
+        Writes balances of several players in one transaction, journal first.
+        results are (hands won, profit, user id) to add to players' counters.
+        """
+        records = [(str(player), player.balance, player.user.id) for player in players]
+        results = list(results)
+
+        for name, balance, user_id in records:
+            self.update_account(user_id, name, balance)
+        self.add_results(results)
 
-    def write_player_data(self, player: Player):
         try:
-            # NOTE: Uses Player type, other functions use discord.Member type
-            record = (str(player), player.balance, player.user.id)
-            self.db.execute("UPDATE poker_players SET name=?, balance=? WHERE user_id=?", record)
-            self.db.commit()
+            await self.db.transaction(self.write_journaled, records, results)
         except sqlite3.Error as e:
             print(type(e).__name__)
+            self.invalidate([user_id for _, _, user_id in records] + [user_id for _, _, user_id in results])
 
-    def load_player_data(self, player: discord.Member):
+    async def load_player_data(self, player: discord.Member):
+        """
+        This function is coroutine.
 
-        self.check_for_player(player)
+        Returns account of the player, it's created on first use.
+        [0] - id, [1] - user_id, [2] - username,
+        [3] - balance, [4] - win count, [5] - next claim time, [6] - profit
+        """
 
-        cursor = self.db.cursor()
+        row = self.accounts.get(player.id)
+        if row is not None:
+            self.accounts.move_to_end(player.id)
+            return row
+
+        # Someone is loading it already
+        loading = self.loading.get(player.id)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        loading = asyncio.get_event_loop().create_future()
+        self.loading[player.id] = loading
+
+        row = None
         try:
-            cursor.execute("SELECT * FROM poker_players WHERE user_id=?", (player.id,))
-            data = cursor.fetchone()
-            cursor.close()
-            # [0] - id, [1] - user_id, [2] - username
-            # [3] - balance, [4] - win count
-            return data
+            row = await self.db.transaction(self.load_account, player.id, str(player))
         except sqlite3.Error as e:
             print(type(e).__name__)
+        finally:
+            del self.loading[player.id]
+            stale = player.id in self.stale
+            self.stale.discard(player.id)
+            # Waiters get None as well if loading has failed or was cancelled
+            loading.set_result(row)
+
+        if row is not None and not stale:
+            self.accounts[player.id] = row
+            if len(self.accounts) > self.MAX_ACCOUNTS:
+                self.accounts.popitem(last=False)
+            # Account might have just been created
+            self.leaderboard.update(player.id, row[2], row[3])
+
+        return row
+
+    async def check_for_player(self, user: discord.Member):
+        await self.load_player_data(user)
+
+    async def get_leaderboard(self, offset, count, user_ids=None):
+        """
+        This function is coroutine.
+
+        Returns (user id, name, balance) of accounts with the highest balances, best first.
+        Only accounts of user_ids if given.
+        """
+
+        rows = self.leaderboard.page(offset, count, user_ids)
+        if rows is not None:
+            return rows
 
-    def check_for_player(self, user: discord.Member):
-        cursor = self.db.cursor()
         try:
-            cursor.execute("SELECT * FROM poker_players WHERE user_id=?", (user.id,))
-            player = cursor.fetchone()
-            if not player:
-                self.add_player(user)
+            if not self.leaderboard.loaded:
+                version = self.leaderboard.begin_load()
+                top = None
+                try:
+                    # Queued after every write, so nothing written before is missed. Only the top of balance index is read
+                    top = await self.db.transaction(self.top_accounts, Leaderboard.SIZE)
+                finally:
+                    self.leaderboard.finish_load(version, top)
+
+                rows = self.leaderboard.page(offset, count, user_ids)
+                if rows is not None:
+                    return rows
+
+            # Deeper than accounts kept in memory, it's read by readers, so it doesn't hold up writes
+            if user_ids is None:
+                return await self.db.fetchall("SELECT user_id, name, balance FROM poker_players "
+                                              "ORDER BY balance DESC LIMIT ? OFFSET ?", (count, offset))
+
+            # Ids are passed as one JSON array, servers can have more members than query can take parameters
+            return await self.db.fetchall("SELECT user_id, name, balance FROM poker_players "
+                                          "WHERE user_id IN (SELECT value FROM json_each(?)) "
+                                          "ORDER BY balance DESC LIMIT ? OFFSET ?", (json.dumps(list(user_ids)), count, offset))
         except sqlite3.Error as e:
             print(type(e).__name__)
+            return []
 
     # Combines both types, discord.Member and Player
-    def claim_money(self, player):
+    async def claim_money(self, player):
+        """
+        This function is coroutine.
 
-        if type(player) is discord.Member:
-            self.check_for_player(player)
+        Adds daily prize to the balance, returns False if it has been claimed already today.
+        Table of a seated player has to be locked, so the balance it keeps doesn't change meanwhile.
+        """
 
-        try:
-            roll = randint(0, 100)
-            if roll > 85:
-                money_to_give = 10000
-            elif roll > 50:
-                money_to_give = 5000
-            else:
-                money_to_give = 1000
+        roll = randint(0, 100)
+        if roll > 85:
+            money_to_give = 10000
+        elif roll > 50:
+            money_to_give = 5000
+        else:
+            money_to_give = 1000
 
-            next_day = 24 * 60 * 60
-            record = ()
+        now = int(time.time())
+        next_claim_time = now + 24 * 60 * 60
 
-            if type(player) is Player:
-                player.balance += money_to_give
-                record = (str(player), player.balance, next_day, player.user.id)
-            elif type(player) is discord.Member:
-                player_balance = self.load_player_data(player)[3]
-                player_balance += money_to_give
-                record = (str(player), player_balance, next_day, player.id)
+        if type(player) is Player:
+            # Balance of seated player is kept by the game, it's written as it is and changed once it's claimed
+            query = "UPDATE poker_players SET name=?, balance=?, next_claim_time=? " \
+                    "WHERE user_id=? AND (next_claim_time IS NULL OR next_claim_time <= ?)"
+            params = (str(player), player.balance + money_to_give, next_claim_time, player.user.id, now)
+        else:
+            # New account gets the prize on top of the starting balance
+            query = "INSERT INTO poker_players(user_id, name, balance, win_count, next_claim_time) VALUES (?,?,5000 + ?,0,?) " \
+                    "ON CONFLICT(user_id) DO UPDATE SET name=excluded.name, balance=balance + ?, next_claim_time=excluded.next_claim_time " \
+                    "WHERE next_claim_time IS NULL OR next_claim_time <= ?"
+            params = (player.id, str(player), money_to_give, next_claim_time, money_to_give, now)
 
-            self.db.execute("UPDATE poker_players SET name=?, balance=?, next_claim_time=strftime('%s','now') + ? WHERE user_id=?", record)
-            self.db.commit()
+        try:
+            claimed = await self.db.execute(query, params) == 1
         except sqlite3.Error as e:
             print(type(e).__name__)
+            claimed = False
 
-    def give_money(self, sender, recipient, amount: int):
+        if not claimed:
+            return False
 
-        if type(sender) is discord.Member:
-            self.check_for_player(sender)
-        if type(recipient) is discord.Member:
-            self.check_for_player(recipient)
+        if type(player) is Player:
+            player.balance += money_to_give
+            self.update_account(player.user.id, str(player), player.balance, next_claim_time)
+        else:
+            self.add_to_account(player.id, money_to_give, next_claim_time)
 
-        sender_balance = self.load_player_data(sender)[3]
+        return True
+
+    # Run in the writer thread
+    def transfer_funds(self, db, debit, credit, amount):
+        """
+        Moves amount from one account to another in one transaction.
 
-        if sender_balance < amount:
+        debit and credit are (user id, balance). Balance of seated player
+        is written as it is, None changes account in place and debit
+        only if there's enough money.
+        """
+        user_id, balance = debit
+        if balance is None:
+            cursor = db.execute("UPDATE poker_players SET balance=balance - ? WHERE user_id=? AND balance >= ?", (amount, user_id, amount))
+        else:
+            cursor = db.execute("UPDATE poker_players SET balance=? WHERE user_id=?", (balance, user_id))
+
+        if cursor.rowcount == 0:
             return False
 
-        self.take_money(sender, amount)
+        user_id, balance = credit
+        if balance is None:
+            cursor = db.execute("UPDATE poker_players SET balance=balance + ? WHERE user_id=?", (amount, user_id))
+        else:
+            cursor = db.execute("UPDATE poker_players SET balance=? WHERE user_id=?", (balance, user_id))
 
-        try:
-            record = ()
-
-            if type(recipient) is Player:
-                recipient.balance += amount
-                record = (str(recipient), recipient.balance, recipient.user.id)
-            elif type(recipient) is discord.Member:
-                player_balance = self.load_player_data(recipient)[3]
-                player_balance += amount
-                record = (str(recipient), player_balance, recipient.id)
-
-            self.db.execute("UPDATE poker_players SET name=?, balance=? WHERE user_id=?", record)
-            self.db.commit()
-        except sqlite3.Error as e:
-            print(type(e).__name__)
+        if cursor.rowcount == 0:
+            # Nobody to give money to, keep the debit out too
+            db.rollback()
+            return False
 
         return True
 
-    def take_money(self, sender, amount: int):
+    async def give_money(self, sender, recipient, amount: int):
+        """
+        This function is coroutine.
+
+        Transfers amount, returns False if sender doesn't have enough money.
+        Tables of seated players have to be locked, like in claim_money().
+        """
+
+        # Accounts are created on first use, both are usually cached
+        if type(sender) is discord.Member:
+            await self.check_for_player(sender)
+        if type(recipient) is discord.Member:
+            await self.check_for_player(recipient)
+
+        debit = (sender.id, None)
+        credit = (recipient.id, None)
+
+        # Seated players' balances are kept by games, so they're checked right here and changed once it's done
+        if type(sender) is Player:
+            if sender.balance < amount:
+                return False
+            debit = (sender.id, sender.balance - amount)
+        if type(recipient) is Player:
+            credit = (recipient.id, recipient.balance + amount)
 
         try:
-            record = ()
-
-            if type(sender) is Player:
-                sender.balance -= amount
-                record = (str(sender), sender.balance, sender.user.id)
-            elif type(sender) is discord.Member:
-                player_balance = self.load_player_data(sender)[3]
-                player_balance -= amount
-                record = (str(sender), player_balance, sender.id)
-
-            self.db.execute("UPDATE poker_players SET name=?, balance=? WHERE user_id=?", record)
-            self.db.commit()
+            transferred = await self.db.transaction(self.transfer_funds, debit, credit, amount)
         except sqlite3.Error as e:
             print(type(e).__name__)
+            transferred = False
+
+        if not transferred:
+            return False
+
+        for holder, change in ((sender, -amount), (recipient, amount)):
+            if type(holder) is Player:
+                holder.balance += change
+                self.update_account(holder.id, str(holder), holder.balance)
+            else:
+                self.add_to_account(holder.id, change)
+
+        return True
 
 
 class Poker:
@@ -703,10 +1283,33 @@ class Poker:
     Poker game commands
     """
 
+    # Players on a leaderboard page
+    LEADERBOARD_PAGE = 10
+
     def __init__(self, bot):
         self.bot = bot
         self.db_funcs = DBFunctions(bot.db)
         self.games = {}
+        # User id -> (game, player) of every seated player
+        self.player_index = {}
+        self.equity = deuces.EquityCalculator()
+        # Turn deadlines of all tables
+        self.scheduler = DeadlineScheduler(bot.loop)
+        # Finished hands of all tables
+        self.history = HandHistory('hand_history')
+        # Server id -> TournamentDirector, one tournament per server
+        self.tournaments = {}
+        # Numbers of AI seats
+        self.ai_count = 0
+
+    def __unload(self):
+        for tables in self.games.values():
+            for game in tables.values():
+                game.stop_equity()
+        self.equity.shutdown()
+        self.db_funcs.close()
+        self.scheduler.close()
+        self.history.close()
 
     def get_game(self, server, channel):
 
@@ -718,16 +1321,57 @@ class Poker:
 
         return self.games[server.id][channel.id]
 
+    def remove_game(self, server, channel):
+
+        game = self.games[server.id].pop(channel.id)
+        self.scheduler.cancel(game)
+
+        # Drop players who are still seated from the index
+        for player in list(game.players):
+            game.discard_player(player)
+        game.release_leavers()
+        game.stop_equity()
+
     # Don't allow player to participate in multiple games
     def player_lookup(self, player: discord.Member):
 
-        for server, channel in self.games.items():
-            for game in channel.values():
-                found_player = game.get_player(player)
-                if found_player is not None:
-                    return found_player
+        entry = self.player_index.get(player.id)
+
+        return entry[1] if entry is not None else None
+
+    # Player who left during a hand stays there until it ends, since he might still win
+    def is_leaving(self, player: discord.Member):
+
+        entry = self.player_index.get(player.id)
+
+        return entry is not None and entry[0].get_player(player) is not entry[1]
+
+    # Tournament chips aren't money, so only players at cash tables are looked up
+    def cash_player_lookup(self, player: discord.Member):
+
+        entry = self.player_index.get(player.id)
+
+        if entry is None or isinstance(entry[0], TournamentTable):
+            return None
+
+        return entry[1]
+
+    # Yields cash_player_lookup() of members with their tables locked, so balances the tables keep don't change meanwhile
+    @contextlib.asynccontextmanager
+    async def cash_players(self, *members):
+        while True:
+            entries = [self.player_index.get(member.id) for member in members]
+            games = {entry[0] for entry in entries if entry is not None and not isinstance(entry[0], TournamentTable)}
 
-        return None
+            async with contextlib.AsyncExitStack() as stack:
+                # Always in the same order, so two commands can't wait for each other's tables
+                for game in sorted(games, key=lambda game: game.channel.id):
+                    await stack.enter_async_context(game.lock)
+
+                # Players might have sat down or left while waiting for the tables
+                if all(self.player_index.get(member.id) is entry for member, entry in zip(members, entries)):
+                    yield [self.cash_player_lookup(member) for member in members]
+                    return
 
     # General actions
     @commands.command(pass_context=True, no_pm=True)
@@ -742,26 +1386,38 @@ class Poker:
         server = ctx.message.server
         channel = ctx.message.channel
 
+        # Loaded before checks, so nothing changes between them and seating
+        account = await self.db_funcs.load_player_data(author)
+
+        if account is None:
+            await self.bot.say("Couldn't load your account, try again later.")
+            return
+
+        player_balance = account[3]
+
         game = self.get_game(server, channel)
 
         if game:
             await self.bot.say("There's an ongoing game! Type \"k.join\" to join the table!")
             return
 
+        if self.is_leaving(author):
+            await self.bot.say("You can't take a seat until the hand you've left is over.")
+            return
+
         lookup_result = self.player_lookup(author)
 
         if lookup_result:
             await self.bot.say("You're not allowed to play in more than one game!")
             return
 
-        player_balance = self.db_funcs.load_player_data(author)[3]
-
         if player_balance < 100:
             await self.bot.say("You don't have enough money to participate in game.")
             return
 
-        game = GameDirector(self.bot, self.db_funcs, channel)
-        game.add_player(author)
+        game = GameDirector(self.bot, self.db_funcs, self.player_index, self.scheduler, self.history, channel)
+        game.on_empty = functools.partial(self.remove_game, server, channel)
+        game.add_player(author, player_balance)
 
         self.games[server.id].update({channel.id: game})
 
@@ -778,11 +1434,23 @@ class Poker:
         server = ctx.message.server
         channel = ctx.message.channel
 
+        # Loaded before checks, so nothing changes between them and seating
+        account = await self.db_funcs.load_player_data(author)
+
+        if account is None:
+            await self.bot.say("Couldn't load your account, try again later.")
+            return
+
+        player_balance = account[3]
+
         game = self.get_game(server, channel)
 
         if not game:
             await self.bot.say("There're no ongoing games. Start new by typing \"k.poker\"!")
             return
+        elif isinstance(game, TournamentTable):
+            await self.bot.say("Players are seated at tournament tables by the tournament.")
+            return
 
         player = game.get_player(author)
 
@@ -790,14 +1458,16 @@ class Poker:
             await self.bot.say("You're participating in this game!")
             return
 
+        if self.is_leaving(author):
+            await self.bot.say("You can't take a seat until the hand you've left is over.")
+            return
+
         lookup_result = self.player_lookup(author)
 
         if lookup_result:
             await self.bot.say("You're not allowed to play in more than one game!")
             return
 
-        player_balance = self.db_funcs.load_player_data(author)[3]
-
         if player_balance < 100:
             await self.bot.say("You don't have enough money to participate in game.")
             return
@@ -805,7 +1475,7 @@ class Poker:
             await self.bot.say("Table limit is 10 people.")
             return
 
-        game.add_player(author)
+        game.add_player(author, player_balance)
 
         await self.bot.say("{} has joined the game!".format(author.name))
 
@@ -831,13 +1501,78 @@ class Poker:
             await self.bot.say("You're not participating in this game!")
             return
 
-        await game.remove_player(player)
+        # Inactivity timeout or another "k.leave" might have come first
+        if not await game.remove_player(player):
+            return
 
         await self.bot.say("You've left the game.")
 
-        if not game.players:
-            del self.games[server.id][channel.id]
-            await self.bot.say("Table is empty! (╯°-°）╯︵ ┻━┻:fire:")
+    @commands.command(pass_context=True, no_pm=True, name='add-bot')
+    async def add_bot(self, ctx, difficulty: str = "medium"):
+        """
+        Seat AI player at the table.
+        Difficulty is easy, medium or hard. AI brings its own $5000.
+        """
+
+        author = ctx.message.author
+        server = ctx.message.server
+        channel = ctx.message.channel
+
+        game = self.get_game(server, channel)
+
+        if not game:
+            await self.bot.say("There're no ongoing games. Start new by typing \"k.poker\"!")
+            return
+        elif isinstance(game, TournamentTable):
+            await self.bot.say("Players are seated at tournament tables by the tournament.")
+            return
+        elif not game.get_player(author):
+            await self.bot.say("You're not participating in this game!")
+            return
+        elif difficulty.upper() not in ai.Difficulty.__members__:
+            await self.bot.say("Difficulty is easy, medium or hard.")
+            return
+        elif len(game.players) == 10:
+            await self.bot.say("Table limit is 10 people.")
+            return
+
+        self.ai_count += 1
+        user = ai.AIUser(self.ai_count, ai.Difficulty[difficulty.upper()])
+
+        game.ai_executor = self.equity.get_executor()
+        game.add_player(user, 5000)
+
+        await self.bot.say("{} has joined the game!".format(user.name))
+
+    @commands.command(pass_context=True, no_pm=True, name='remove-bot')
+    async def remove_bot(self, ctx):
+        """
+        Remove AI player from the table.
+        """
+
+        author = ctx.message.author
+        server = ctx.message.server
+        channel = ctx.message.channel
+
+        game = self.get_game(server, channel)
+
+        if not game:
+            await self.bot.say("There're no ongoing games. Start new by typing \"k.poker\"!")
+            return
+        elif not game.get_player(author):
+            await self.bot.say("You're not participating in this game!")
+            return
+
+        bots = [player for player in game.players if isinstance(player.user, ai.AIUser)]
+
+        if not bots:
+            await self.bot.say("There're no AI players at the table.")
+            return
+
+        if not await game.remove_player(bots[-1]):
+            return
+
+        await self.bot.say("{} has left the game.".format(bots[-1].user.name))
 
     @commands.command(pass_context=True, no_pm=False)
     async def claim(self, ctx):
@@ -847,22 +1582,17 @@ class Poker:
         """
 
         author = ctx.message.author
-        cursor = self.bot.db.cursor()
-
-        cursor.execute("SELECT * FROM poker_players WHERE next_claim_time > strftime('%s','now') and user_id=?", (author.id,))
-        result = cursor.fetchone()
-        cursor.close()
-
-        if result:
-            await self.bot.say("You have already claimed your daily prize today!")
-            return
 
         # Since we can use this command in any other channel - look up player
-        player = self.player_lookup(author)
+        async with self.cash_players(author) as (player,):
 
-        requester = player if player else author
+            requester = player if player else author
 
-        self.db_funcs.claim_money(requester)
+            claimed = await self.db_funcs.claim_money(requester)
+
+        if not claimed:
+            await self.bot.say("You have already claimed your daily prize today!")
+            return
 
         await self.bot.say("You have successfully claimed daily prize!")
 
@@ -890,13 +1620,12 @@ class Poker:
             return
 
         # Same as in 'claim' command - get games and find players in them
-        player_sender = self.player_lookup(author)
-        player_recipient = self.player_lookup(member)
+        async with self.cash_players(author, member) as (player_sender, player_recipient):
 
-        sender = player_sender if player_sender else author
-        recipient = player_recipient if player_recipient else member
+            sender = player_sender if player_sender else author
+            recipient = player_recipient if player_recipient else member
 
-        result = self.db_funcs.give_money(sender, recipient, amount)
+            result = await self.db_funcs.give_money(sender, recipient, amount)
 
         if not result:
             await self.bot.say("You don't have enough money to transfer.")
@@ -912,8 +1641,54 @@ class Poker:
 
         author = ctx.message.author
 
-        player_balance = self.db_funcs.load_player_data(author)[3]
-        await self.bot.say("Your balance is ${}".format(player_balance))
+        account = await self.db_funcs.load_player_data(author)
+
+        if account is None:
+            await self.bot.say("Couldn't load your account, try again later.")
+            return
+
+        await self.bot.say("Your balance is ${}\n"
+                           "Hands won: {}, profit: ${}".format(account[3], account[4], account[6]))
+
+    @commands.command(pass_context=True, no_pm=False)
+    async def leaderboard(self, ctx, view: str = "server", page: int = 1):
+        """
+        Shows players with the highest balances.
+        k.leaderboard [server|global] [page]
+        """
+
+        server = ctx.message.server
+
+        # Page might be given without the view
+        if view.isdigit():
+            view, page = "server", int(view)
+
+        if view not in ("server", "global") or page < 1:
+            await self.bot.say("Usage: k.leaderboard [server|global] [page]")
+            return
+
+        # There's no server in direct messages
+        if server is None:
+            view = "global"
+
+        offset = (page - 1) * self.LEADERBOARD_PAGE
+        if view == "global":
+            title = "Global leaderboard"
+            rows = await self.db_funcs.get_leaderboard(offset, self.LEADERBOARD_PAGE)
+        else:
+            title = "{} leaderboard".format(server.name)
+            user_ids = {member.id for member in server.members}
+            rows = await self.db_funcs.get_leaderboard(offset, self.LEADERBOARD_PAGE, user_ids)
+
+        if not rows:
+            await self.bot.say("There're no players on this page.")
+            return
+
+        embeded = discord.Embed(title=title, description="Page {}".format(page), color=0xEE8700)
+        for place, (_, name, balance) in enumerate(rows, offset + 1):
+            embeded.add_field(name="{}. {}".format(place, name), value="${}".format(balance), inline=False)
+
+        await self.bot.say(embed=embeded)
 
     # TODO: Game initiator, on ready start, or stay as is?
     @commands.command(pass_context=True, no_pm=True)
@@ -937,6 +1712,9 @@ class Poker:
         if not player:
             await self.bot.say("You're not participating in this game!")
             return
+        elif isinstance(game, TournamentTable):
+            await self.bot.say("Tournament hands start on their own.")
+            return
         elif game.status is not GameStatus.PENDING:
             await self.bot.say("The game is in process.")
             return
@@ -944,17 +1722,145 @@ class Poker:
             await self.bot.say("You can't start game alone.")
             return
 
-        game.create_table()
-        game.set_status(GameStatus.PREFLOP)
-        game.check_players()
+        await game.start_hand()
 
-        for player in game.players:
-            cards = [deuces.Card.int_to_pretty_str(card) for card in player.hand]
-            await self.bot.send_message(player.user, "Your cards are: {}".format(" and ".join(cards)))
+    # Tournaments
+    @commands.command(pass_context=True, no_pm=True)
+    async def tournament(self, ctx, starting_stack: int = 1500, level_minutes: int = 10):
+        """
+        Opens tournament registration in this channel.
+        Everyone starts with the same stack of chips and blinds go up every few minutes.
+        Chips aren't money, the last player with chips wins.
+        """
 
-        await self.bot.say("Setting up the table and starting the game!\n")
+        server = ctx.message.server
+        channel = ctx.message.channel
+        author = ctx.message.author
+
+        if server.id in self.tournaments:
+            await self.bot.say("There's a tournament on this server already! Type \"k.register\" to take part.")
+            return
+        elif starting_stack < 100 or level_minutes <= 0:
+            await self.bot.say("Invalid amount.")
+            return
+
+        self.tournaments[server.id] = TournamentDirector(self, server, channel, author, starting_stack, level_minutes)
+
+        await self.bot.say("{} has opened a tournament with ${} stacks!\n"
+                           "Type \"k.register\" to take part and \"k.tournament-table\" in channels for tables. "
+                           "Type \"k.tournament-start\" once everyone is ready!".format(author.name, starting_stack))
+
+    @commands.command(pass_context=True, no_pm=True)
+    async def register(self, ctx):
+        """
+        Register for tournament.
+        """
 
-        await game.get_next_player()
+        server = ctx.message.server
+        author = ctx.message.author
+
+        director = self.tournaments.get(server.id)
+
+        if not director:
+            await self.bot.say("There're no tournaments. Open one by typing \"k.tournament\"!")
+            return
+        elif director.tournament.started:
+            await self.bot.say("The tournament is in process.")
+            return
+        elif not director.tournament.register(author.id):
+            await self.bot.say("You're registered already!")
+            return
+
+        director.members[author.id] = author
+
+        await self.bot.say("{} has registered for the tournament!".format(author.name))
+
+    @commands.command(pass_context=True, no_pm=True, name='tournament-table')
+    async def tournament_table(self, ctx):
+        """
+        Use this channel for a tournament table.
+        """
+
+        server = ctx.message.server
+        channel = ctx.message.channel
+        author = ctx.message.author
+
+        director = self.tournaments.get(server.id)
+
+        if not director:
+            await self.bot.say("There're no tournaments. Open one by typing \"k.tournament\"!")
+            return
+        elif author != director.host:
+            await self.bot.say("Only the host can do it.")
+            return
+        elif director.tournament.started:
+            await self.bot.say("The tournament is in process.")
+            return
+        elif channel in director.channels:
+            await self.bot.say("This channel has a tournament table already.")
+            return
+
+        director.channels.append(channel)
+
+        await self.bot.say("Tournament table {} will be in this channel.".format(len(director.channels)))
+
+    @commands.command(pass_context=True, no_pm=True, name='tournament-start')
+    async def tournament_start(self, ctx):
+        """
+        Seat registered players and start tournament.
+        """
+
+        server = ctx.message.server
+        author = ctx.message.author
+
+        director = self.tournaments.get(server.id)
+
+        if not director:
+            await self.bot.say("There're no tournaments. Open one by typing \"k.tournament\"!")
+            return
+        elif author != director.host:
+            await self.bot.say("Only the host can do it.")
+            return
+        elif director.tournament.started:
+            await self.bot.say("The tournament is in process.")
+            return
+
+        entrants = len(director.tournament.ids)
+        tables_needed = director.tournament.tables_needed(entrants)
+
+        if entrants < 2:
+            await self.bot.say("You can't start tournament alone.")
+            return
+        elif len(director.channels) < tables_needed:
+            await self.bot.say("{} players need {} tables. Type \"k.tournament-table\" in more channels.".format(entrants, tables_needed))
+            return
+
+        busy = [member.name for member in director.members.values() if self.player_lookup(member)]
+        if busy:
+            await self.bot.say("Players {} have to leave their tables first.".format(", ".join(busy)))
+            return
+
+        if any(self.get_game(server, channel) for channel in director.channels[:tables_needed]):
+            await self.bot.say("Tables' channels have ongoing games.")
+            return
+
+        await director.start()
+
+    @commands.command(pass_context=True, no_pm=True, name='tournament-info')
+    async def tournament_info(self, ctx):
+        """
+        Shows information about tournament.
+        """
+
+        server = ctx.message.server
+
+        director = self.tournaments.get(server.id)
+
+        if not director:
+            await self.bot.say("There're no tournaments. Open one by typing \"k.tournament\"!")
+            return
+
+        await director.get_info()
 
     # Game actions
     @commands.command(pass_context=True, no_pm=True)
@@ -981,11 +1887,91 @@ class Poker:
         elif game.status is GameStatus.PENDING:
             await self.bot.say("Game is not running.")
             return
-        elif player.status is not PlayerStatus.THONKING:
+
+        # Not his turn, or his action for this turn is queued already
+        if not await game.make_check(player):
             await self.bot.say("You can't make any actions!")
+
+    @commands.command(pass_context=True, no_pm=True)
+    async def odds(self, ctx):
+        """
+        Shows your chances to win against players left in the game.
+        """
+
+        author = ctx.message.author
+        server = ctx.message.server
+        channel = ctx.message.channel
+
+        game = self.get_game(server, channel)
+
+        if not game:
+            await self.bot.say("There're no ongoing games. Start new by typing \"k.poker\"!")
+            return
+
+        player = game.get_player(author)
+
+        if not player:
+            await self.bot.say("You're not participating in this game!")
+            return
+        elif game.status is GameStatus.PENDING:
+            await self.bot.say("Game is not running.")
             return
+        elif player.status is PlayerStatus.FOLDED:
+            await self.bot.say("You've folded your cards.")
+            return
+
+        opponents = len(game.table.rotation) - 1
 
-        await game.make_check(player)
+        if not game.table.cards and opponents + 1 <= PreflopTable.MAX_PLAYERS:
+            # Preflop equities are precomputed up to 9 players, a full table is simulated
+            equity = PreflopTable.equity(player.hand[0], player.hand[1], opponents + 1)
+            await self.bot.send_message(author, "Your chances to win against {} player(s): **{:.1%}** "
+                                                "(preflop all-in)".format(opponents, equity))
+            return
+
+        # Simulations run in worker processes, so the bot keeps responding meanwhile
+        try:
+            equity = await self.equity.calculate_async(player.hand, game.table.cards, opponents, simulations=20000)
+        except (ValueError, BrokenProcessPool) as e:
+            print("Equity calculation failed. Reason: {}".format(type(e).__name__))
+            # Pool with a dead worker doesn't take jobs anymore, the next calculation starts a new one
+            if isinstance(e, BrokenProcessPool):
+                self.equity.shutdown()
+            await self.bot.say("I couldn't calculate your chances. Please, try again.")
+            return
+
+        if equity.low == equity.high:
+            # Exact equity, every remaining deal has been played out
+            interval = "exact"
+        else:
+            interval = "from {:.1%} to {:.1%}".format(equity.low, equity.high)
+
+        await self.bot.send_message(author, "Your chances to win against {} player(s): **{:.1%}** "
+                                            "({})".format(opponents, equity.equity, interval))
+
+    @commands.command(pass_context=True, no_pm=True, name='live-equity')
+    async def live_equity(self, ctx):
+        """
+        Turns live equity of all-in players on or off.
+        Once nobody can bet anymore, everyone's chances are shown and updated as streets come out.
+        """
+
+        server = ctx.message.server
+        channel = ctx.message.channel
+
+        game = self.get_game(server, channel)
+
+        if not game:
+            await self.bot.say("There're no ongoing games. Start new by typing \"k.poker\"!")
+            return
+
+        if game.equity is None:
+            game.equity = self.equity
+            await self.bot.say("Live equity is on. It's shown once players are all-in.")
+        else:
+            game.equity = None
+            game.stop_equity()
+            await self.bot.say("Live equity is off.")
 
     @commands.command(pass_context=True, no_pm=True, name='table-info')
     async def table_info(self, ctx):
@@ -1028,11 +2014,10 @@ class Poker:
         elif game.status is GameStatus.PENDING:
             await self.bot.say("Game is not running.")
             return
-        elif player.status is not PlayerStatus.THONKING:
-            await self.bot.say("You can't make any actions!")
-            return
 
-        await game.make_call(player)
+        # Not his turn, or his action for this turn is queued already
+        if not await game.make_call(player):
+            await self.bot.say("You can't make any actions!")
 
     @commands.command(pass_context=True, no_pm=True)
     async def bet(self, ctx, amount: int):
@@ -1062,11 +2047,10 @@ class Poker:
         elif game.status is GameStatus.PENDING:
             await self.bot.say("Game is not running.")
             return
-        elif player.status is not PlayerStatus.THONKING:
-            await self.bot.say("You can't make any actions!")
-            return
 
-        await game.make_bet(player, amount)
+        # Not his turn, or his action for this turn is queued already
+        if not await game.make_bet(player, amount):
+            await self.bot.say("You can't make any actions!")
 
     @commands.command(pass_context=True, no_pm=True, name='raise')
     async def raise_stake(self, ctx, amount: int):
@@ -1096,11 +2080,10 @@ class Poker:
         elif game.status is GameStatus.PENDING:
             await self.bot.say("Game is not running.")
             return
-        elif player.status is not PlayerStatus.THONKING:
-            await self.bot.say("You can't make any actions!")
-            return
 
-        await game.make_raise(player, amount)
+        # Not his turn, or his action for this turn is queued already
+        if not await game.make_raise(player, amount):
+            await self.bot.say("You can't make any actions!")
 
     @commands.command(pass_context=True, no_pm=True, name='all-in')
     async def all_in(self, ctx):
@@ -1126,11 +2109,10 @@ class Poker:
         elif game.status is GameStatus.PENDING:
             await self.bot.say("Game is not running.")
             return
-        elif player.status is not PlayerStatus.THONKING:
-            await self.bot.say("You can't make any actions!")
-            return
 
-        await game.make_all_in(player)
+        # Not his turn, or his action for this turn is queued already
+        if not await game.make_all_in(player):
+            await self.bot.say("You can't make any actions!")
 
     @commands.command(pass_context=True, no_pm=True)
     async def fold(self, ctx):
@@ -1156,11 +2138,10 @@ class Poker:
         elif game.status is GameStatus.PENDING:
             await self.bot.say("Game is not running.")
             return
-        elif player.status is not PlayerStatus.THONKING:
-            await self.bot.say("You can't make any actions!")
-            return
 
-        await game.make_fold(player)
+        # Not his turn, or his action for this turn is queued already
+        if not await game.make_fold(player):
+            await self.bot.say("You can't make any actions!")
 
 
 def setup(bot):
@@ -0,0 +1,96 @@
+import heapq
+import itertools
+
+
+class DeadlineScheduler:
+    """
+    Deadlines of many owners on one heap and one loop.call_at handle.
+
+    Every key has at most one deadline. Arming a key again reschedules it
+    and cancelling only marks the old entry, so all of them are O(log n).
+    Dead entries are skipped when they reach the top of the heap and the
+    heap is rebuilt when they take more than half of it.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+        self.handle = None
+        self.handle_deadline = None
+
+    def arm(self, key, delay, callback, *args):
+        """
+        Calls callback(*args) in delay seconds, replacing previous deadline of the key.
+        """
+        self.cancel(key)
+
+        # [deadline, tie breaker, key, callback, args, alive]
+        entry = [self.loop.time() + delay, next(self.counter), key, callback, args, True]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+
+        self.rearm()
+
+    def cancel(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        entry[5] = False
+
+        # Too many dead entries, drop them
+        if len(self.heap) > 2 * len(self.entries) + 16:
+            self.heap = [entry for entry in self.heap if entry[5]]
+            heapq.heapify(self.heap)
+
+        self.rearm()
+
+    def remaining(self, key):
+        """
+        Seconds left until deadline of the key or None if it isn't armed.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return max(entry[0] - self.loop.time(), 0.0)
+
+    def rearm(self):
+        # Drop dead entries from the top
+        while self.heap and not self.heap[0][5]:
+            heapq.heappop(self.heap)
+
+        deadline = self.heap[0][0] if self.heap else None
+        if deadline == self.handle_deadline:
+            return
+
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+        self.handle_deadline = deadline
+        if deadline is not None:
+            self.handle = self.loop.call_at(deadline, self.fire)
+
+    def fire(self):
+        self.handle = None
+        self.handle_deadline = None
+        now = self.loop.time()
+
+        while self.heap and self.heap[0][0] <= now:
+            deadline, _, key, callback, args, alive = heapq.heappop(self.heap)
+            if alive:
+                del self.entries[key]
+                # Every callback runs on its own, so one failing doesn't affect others
+                self.loop.call_soon(callback, *args)
+
+        self.rearm()
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.cancel()
+        self.heap = []
+        self.entries = {}
+        self.handle = None
+        self.handle_deadline = None
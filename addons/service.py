@@ -42,19 +42,14 @@ class Service:
     @commands.command()
     @checks.is_access_allowed(required_level=9000)
     async def reload(self):
-        """Reloads addons, db and config (owner only)"""
+        """Reloads addons and config (owner only)"""
 
         # Reload configuration file so we (probably) can apply some settings on the fly
         # Might be useful
         with open('config.json') as data:
             self.bot.config = json.load(data)
 
-        # TESTING: Potentially unsafe and might lead to data corruption.
-        # Commit all changes and close connection before proceed
-        self.bot.db.commit()
-        self.bot.db.close()
-        # Reinitilize connection to database
-        self.bot.db = sqlite3.connect('main.db')
+        # Database gateway commits every write, so it stays open across reloads
 
         # Reload extensions
         for extension in self.bot.config['extensions']:
@@ -106,15 +101,11 @@ class Service:
     async def roles_list(self, ctx):
         """Returns roles list for this server (Level 3)"""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx.message, cursor, "roles"):
+        if not await utils.db_check(self.bot, ctx.message, "roles"):
             return
 
         msg = "```List of roles:\n"
-        cursor.execute("SELECT * FROM roles WHERE serverid=?", (ctx.message.server.id,))
-        data = cursor.fetchall()
-        cursor.close()
+        data = await self.bot.db.fetchall("SELECT * FROM roles WHERE serverid=?", (ctx.message.server.id,))
         if data:
             for row in data:
                 msg += "ID: {} | Role name: {} | Level: {}\n".format(row[1], row[2], row[3])
@@ -128,9 +119,7 @@ class Service:
     async def roles_add(self, ctx, name: str, level: int):
         """Add role"""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx.message, cursor, "roles"):
+        if not await utils.db_check(self.bot, ctx.message, "roles"):
             return
 
         role = discord.get(ctx.message.server.roles, name=name)
@@ -139,14 +128,11 @@ class Service:
             print("Role wasn't found.")
             return
 
-        db = self.bot.db
-
         record = (role.id, role.name.lower(), level, ctx.message.server.id)
         query = 'INSERT INTO roles(role_id, role, level, serverid) VALUES (?,?,?,?)'
 
         try:
-            db.execute(query, record)
-            db.commit()
+            await self.bot.db.execute(query, record)
             # Add role to storage
             self.bot.access_roles[ctx.message.server.id].update({role.id: level})
             await self.send("Your record has been successfully added.")
@@ -158,9 +144,7 @@ class Service:
     async def roles_remove(self, ctx, name: str):
         """Remove role"""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx, cursor, "roles"):
+        if not await utils.db_check(self.bot, ctx.message, "roles"):
             return
 
         role = discord.get(ctx.message.server.roles, name=name)
@@ -169,14 +153,11 @@ class Service:
             print("Role wasn't found.")
             return
 
-        db = self.bot.db
-
         record = (role.name.lower(), ctx.message.server.id)
         query = 'DELETE FROM roles WHERE role=? AND serverid=?'
-        if db.execute(query, record).rowcount == 0:
+        if await self.bot.db.execute(query, record) == 0:
             await self.send("Failed to remove this record.")
         else:
-            db.commit()
             # Remove role from storage
             self.bot.access_roles[ctx.message.server.id].pop(role.id)
             await self.send("This record has been successfully removed.")
@@ -193,9 +174,11 @@ class Service:
     async def db_init(self, ctx):
         """Initializes db (required on first start)"""
 
-        db = self.bot.db
+        roles = [
+            ('commander', 3, '132200767799951360'), ('moderator', 2, '132200767799951360')
+        ]
 
-        try:
+        def init(db):
             db.execute('CREATE TABLE IF NOT EXISTS memes (name varchar primary key, image_url text)')
             memes = [
                 ('hug', 'https://i.imgur.com/BlSC6Ek.jpg'),
@@ -223,12 +206,11 @@ class Service:
             ]
             db.executemany('INSERT INTO sounds VALUES (?)', sounds)
 
-            roles = [
-                ('commander', 3, '132200767799951360'), ('moderator', 2, '132200767799951360')
-            ]
             db.executemany('INSERT INTO roles(role, level, serverid) VALUES (?,?,?)', roles)
 
-            db.commit()
+        try:
+            # All tables are filled in one transaction
+            await self.bot.db.transaction(init)
 
             # Put roles in storage
             # role[0] - role name
@@ -245,7 +227,6 @@ class Service:
     async def db_add(self, table: str, name: str, content: str):
         """Add record"""
 
-        db = self.bot.db
         if table == "sounds":
             record = (name,)
             query = 'INSERT INTO {} VALUES (?)'.format(table)
@@ -254,8 +235,7 @@ class Service:
             query = 'INSERT INTO {} VALUES (?,?)'.format(table)
 
         try:
-            db.execute(query, record)
-            db.commit()
+            await self.bot.db.execute(query, record)
             await self.send("Your record has been successfully added.")
         except sqlite3.Error:
             await self.send("Failed to add new record.")
@@ -265,13 +245,11 @@ class Service:
     async def db_edit(self, table: str, name: str, column: str, value: str):
         """Edit record"""
 
-        db = self.bot.db
         record = (name,)
         query = 'UPDATE {} SET {} = "{}" WHERE name=?'.format(table, column, value)
-        if db.execute(query, record).rowcount == 0:
+        if await self.bot.db.execute(query, record) == 0:
             await self.send("This record wasn't found.")
         else:
-            db.commit()
             await self.send("This record has been successfully edited.")
 
     @db.command(name="rm")
@@ -279,13 +257,11 @@ class Service:
     async def db_remove(self, table: str, name: str):
         """Remove record"""
 
-        db = self.bot.db
         record = (name,)
         query = 'DELETE FROM {} WHERE name=?'.format(table)
-        if db.execute(query, record).rowcount == 0:
+        if await self.bot.db.execute(query, record) == 0:
             await self.send("Failed to remove this record.")
         else:
-            db.commit()
             await self.send("This record has been successfully removed.")
 
 
@@ -0,0 +1,172 @@
+# Multi-table tournament bookkeeping without any Discord code.
+# Seats entrants, keeps the blind clock level and plans moves between tables.
+
+from array import array
+from random import Random
+
+
+class Tournament:
+    """
+    Entrants, tables and blind level of a tournament.
+
+    Entrants are numbered in order of registration and everything kept
+    per entrant or table besides user id is an item of a typed array,
+    so a few thousand entrants take a few hundred kilobytes at most.
+    Chips are kept by table engines.
+    """
+
+    # (small blind, big blind), the last level stays until the end
+    BLIND_LEVELS = (
+        (10, 20), (15, 30), (25, 50), (50, 100), (75, 150), (100, 200), (150, 300), (200, 400),
+        (300, 600), (400, 800), (500, 1000), (750, 1500), (1000, 2000), (1500, 3000), (2000, 4000),
+        (3000, 6000), (5000, 10000), (10000, 20000),
+    )
+
+    def __init__(self, starting_stack=1500, table_size=9, seed=None):
+        self.starting_stack = starting_stack
+        self.table_size = table_size
+        self.level = 0
+        self.rng = Random(seed)
+        # User ids by entrant number and entrant number by user id
+        self.ids = []
+        self.entrants = {}
+        # Table of every entrant, -1 once he's out
+        self.seating = array('h')
+        # Finishing place of every entrant, 0 while he plays
+        self.places = array('H')
+        # Players at every table, broken tables have none
+        self.counts = array('H')
+        self.remaining = 0
+
+    @property
+    def blinds(self):
+        return self.BLIND_LEVELS[min(self.level, len(self.BLIND_LEVELS) - 1)]
+
+    @property
+    def started(self):
+        return len(self.counts) != 0
+
+    def raise_level(self):
+        self.level += 1
+        return self.blinds
+
+    # Entrants
+    def register(self, user_id):
+        """
+        Registers entrant before the start, returns False if he's registered already.
+        """
+        if user_id in self.entrants:
+            return False
+
+        self.entrants[user_id] = len(self.ids)
+        self.ids.append(user_id)
+        self.seating.append(-1)
+        self.places.append(0)
+        return True
+
+    def tables_needed(self, players=None):
+        players = self.remaining if players is None else players
+        return max(-(-players // self.table_size), 1)
+
+    def seat(self):
+        """
+        Seats all entrants at random at as few tables as possible, evenly.
+        Returns list of user ids at every table.
+        """
+        order = list(range(len(self.ids)))
+        self.rng.shuffle(order)
+
+        tables = [[] for _ in range(self.tables_needed(len(order)))]
+        for position, entrant in enumerate(order):
+            table = position % len(tables)
+            tables[table].append(self.ids[entrant])
+            self.seating[entrant] = table
+
+        self.counts = array('H', (len(table) for table in tables))
+        self.remaining = len(order)
+
+        return tables
+
+    def table_of(self, user_id):
+        entrant = self.entrants.get(user_id)
+        if entrant is None or self.seating[entrant] < 0:
+            return None
+        return self.seating[entrant]
+
+    def eliminate(self, user_id):
+        """
+        Takes entrant out of the tournament, returns his finishing place.
+        """
+        entrant = self.entrants[user_id]
+        table = self.seating[entrant]
+        if table < 0:
+            return self.places[entrant]
+
+        self.counts[table] -= 1
+        self.seating[entrant] = -1
+        self.places[entrant] = self.remaining
+        self.remaining -= 1
+
+        return self.places[entrant]
+
+    def finish(self):
+        """
+        Gives the first place to the last entrant left and returns his user id.
+        """
+        entrant = next(entrant for entrant, table in enumerate(self.seating) if table >= 0)
+        self.eliminate(self.ids[entrant])
+        return self.ids[entrant]
+
+    def move(self, user_id, table):
+        entrant = self.entrants[user_id]
+        self.counts[self.seating[entrant]] -= 1
+        self.counts[table] += 1
+        self.seating[entrant] = table
+
+    # Tables
+    def active_tables(self):
+        return [table for table, count in enumerate(self.counts) if count]
+
+    def plan_moves(self, table, idle):
+        """
+        Plans moves after a hand at table has finished, returns (from table, to table) for every player to move.
+
+        If everyone fits at fewer tables, the smallest idle table is broken and its players
+        go to the shortest tables. Otherwise players are moved from the table until it
+        has at most one player more than the shortest one. Only idle tables lose players.
+        """
+        counts = list(self.counts)
+        active = self.active_tables()
+        moves = []
+
+        if len(active) > self.tables_needed():
+            candidates = [candidate for candidate in idle if counts[candidate]]
+            if not candidates:
+                return moves
+
+            source = min(candidates, key=counts.__getitem__)
+            destinations = [destination for destination in active if destination != source]
+            while counts[source]:
+                destination = min(destinations, key=counts.__getitem__)
+                counts[source] -= 1
+                counts[destination] += 1
+                moves.append((source, destination))
+
+            return moves
+
+        while True:
+            destination = min(active, key=counts.__getitem__)
+            if counts[table] - counts[destination] < 2:
+                return moves
+
+            counts[table] -= 1
+            counts[destination] += 1
+            moves.append((table, destination))
+
+    def standings(self):
+        """
+        User ids of entrants who are out, best place first.
+        """
+        finished = [entrant for entrant, place in enumerate(self.places) if place]
+        finished.sort(key=self.places.__getitem__)
+        return [self.ids[entrant] for entrant in finished]
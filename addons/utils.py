@@ -1,8 +1,10 @@
+import time
+import asyncio
 import sqlite3
 
 
 # These methods are static since they're used in different addons
-async def db_check(bot, msg, cursor, table: str):
+async def db_check(bot, msg, table: str):
     """
     This function is coroutine.
 
@@ -10,18 +12,16 @@ async def db_check(bot, msg, cursor, table: str):
 
     :param bot: Bot instance
     :param msg: Message
-    :param cursor: Database cursor
     :param table: Table name
     :return: Bool
     """
 
     try:
-        cursor.execute('SELECT 1 FROM {}'.format(table))
+        await bot.db.fetchone('SELECT 1 FROM {}'.format(table))
         return True
     except sqlite3.Error:
         await bot.send_message(msg.channel, "Table {} is not initialized.\n\n"
                                             "Hint: Use `Kurisu, db init` to perform database initialization.".format(table))
-        cursor.close()
         return False
 
 
@@ -100,6 +100,86 @@ async def get_members(bot, msg, name: str):
                 return members
 
 
+class RateLimiter:
+    """
+    Token buckets of requests per route and one bucket shared by all routes.
+    Defaults are Discord's limits for sending messages to a channel.
+    """
+
+    def __init__(self, route_rate=5, route_per=5.0, global_rate=50, global_per=1.0):
+        self.route_rate = route_rate
+        self.route_per = route_per
+        self.global_rate = global_rate
+        self.global_per = global_per
+        # [tokens, time of last update]
+        self.routes = {}
+        self.global_bucket = [global_rate, time.monotonic()]
+
+    @staticmethod
+    def refill(bucket, rate, per, now):
+        bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate / per)
+        bucket[1] = now
+        # Seconds until there's a token
+        return max(1 - bucket[0], 0) * per / rate
+
+    async def acquire(self, route):
+        """
+        This function is coroutine.
+
+        Waits until both route and global budgets allow one more request.
+        """
+        while True:
+            now = time.monotonic()
+
+            # Full buckets are the same as missing ones
+            if len(self.routes) > 1024:
+                self.routes = {key: bucket for key, bucket in self.routes.items()
+                               if bucket[0] + (now - bucket[1]) * self.route_rate / self.route_per < self.route_rate}
+
+            bucket = self.routes.setdefault(route, [self.route_rate, now])
+            wait = max(self.refill(bucket, self.route_rate, self.route_per, now),
+                       self.refill(self.global_bucket, self.global_rate, self.global_per, now))
+
+            if wait == 0:
+                bucket[0] -= 1
+                self.global_bucket[0] -= 1
+                return
+
+            await asyncio.sleep(wait)
+
+
+# Shared by everything that sends direct messages
+dm_limiter = RateLimiter()
+
+
+async def send_messages(bot, messages, limiter=None):
+    """
+    This function is coroutine.
+
+    Sends messages concurrently within rate limits.
+    One failed message doesn't stop the others, whatever it has failed with.
+
+    :param bot: Bot instance
+    :param messages: List of (destination, content)
+    :param limiter: RateLimiter, shared direct messages limiter by default
+    :return: List of (destination, exception) of failed messages
+    """
+
+    limiter = limiter or dm_limiter
+
+    async def send(destination, content):
+        await limiter.acquire(destination.id)
+        try:
+            await bot.send_message(destination, content)
+        except Exception as e:
+            print("Failed to send message to {}. Reason: {}".format(destination, type(e).__name__))
+            return destination, e
+
+    results = await asyncio.gather(*[send(destination, content) for destination, content in messages])
+
+    return [result for result in results if result is not None]
+
+
 # Dummy cog
 class Utils:
 
@@ -311,16 +311,12 @@ class Voice:
     async def sounds(self, ctx):
         """List sounds."""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx.message, cursor, "sounds"):
+        if not await utils.db_check(self.bot, ctx.message, "sounds"):
             return
 
         msg = "`Usage: Kurisu, play <name>`\n```List of sounds:\n"
 
-        cursor.execute("SELECT * FROM sounds")
-        data = cursor.fetchall()
-        cursor.close()
+        data = await self.bot.db.fetchall("SELECT * FROM sounds")
         for row in data:
             msg += row[0] + "\n"
         msg += "random\n"
@@ -331,28 +327,22 @@ class Voice:
     async def play(self, ctx, *, name: str):
         """Plays local sound. Usage: Kurisu, play <name>"""
 
-        cursor = self.bot.db.cursor()
-
-        if not await utils.db_check(self.bot, ctx.message, cursor, "sounds"):
+        if not await utils.db_check(self.bot, ctx.message, "sounds"):
             return
 
         if name == "random":
-            cursor.execute("SELECT * FROM sounds")
-            data = cursor.fetchall()
+            data = await self.bot.db.fetchall("SELECT * FROM sounds")
             sounds = []
             for row in data:
                 sounds.append(row[0])
             snd = choice(sounds)
         else:
-            cursor.execute("SELECT * FROM sounds WHERE name=?", (name,))
-            row = cursor.fetchone()
+            row = await self.bot.db.fetchone("SELECT * FROM sounds WHERE name=?", (name,))
             if not row:
                 await self.bot.send_message(ctx.message.channel, "Sound not found!")
                 return
             snd = row[0]
 
-        cursor.close()
-
         state = self.get_voice_state(ctx.message.server)
 
         if state.is_playing() or state.current_sound:
@@ -7,10 +7,10 @@
 # Import dependencies
 import os, sys
 import json
-import sqlite3
 import discord
 from datetime import datetime
 from discord.ext import commands
+from addons.database import Database
 
 description = """
 ハロー, my name is Kurisu Makise.
@@ -27,20 +27,36 @@ os.chdir(dir_path)
 prefixes = commands.when_mentioned_or('Kurisu, ', "kurisu, ", 'k.', 'K.')
 bot = commands.Bot(command_prefix=prefixes, description=description, pm_help=None)
 
-# Read config
-if not os.path.isfile("config.json"):
-    sys.exit("Set up your config.json file first!")
 
-with open('config.json') as data:
-    bot.config = json.load(data)
+def create_tables(db):
+    # Create tables for muted members and access roles. Necessary for basic functionality.
+    db.execute('CREATE TABLE IF NOT EXISTS mutes (id integer NOT NULL primary key AUTOINCREMENT, member_id varchar, member_name varchar, mute_time integer, server_id varchar)')
+    db.execute('CREATE TABLE IF NOT EXISTS roles (id integer NOT NULL primary key AUTOINCREMENT, role_id varchar, role varchar, level int, serverid varchar)')
+    db.execute('CREATE TABLE IF NOT EXISTS poker_players (id integer NOT NULL primary key AUTOINCREMENT, user_id varchar, name varchar, balance int, win_count int, next_claim_time integer, profit integer DEFAULT 0)')
+    db.execute('CREATE TABLE IF NOT EXISTS poker_journal (id integer NOT NULL primary key, last_seq integer)')
+
+    # Hands won and profit are counted per hand since profit column was added
+    if 'profit' not in [column[1] for column in db.execute('PRAGMA table_info(poker_players)')]:
+        db.execute('ALTER TABLE poker_players ADD COLUMN profit integer DEFAULT 0')
+        db.execute('UPDATE poker_players SET win_count=0 WHERE win_count IS NULL')
+
+    # Poker accounts are upserted by user id. Duplicates left by older versions are merged into the first one before it's unique.
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='poker_players_user_id'").fetchone():
+        duplicates = [row[0] for row in db.execute('SELECT user_id FROM poker_players GROUP BY user_id HAVING COUNT(*) > 1')]
+        if duplicates:
+            print("Merging duplicate poker accounts of {}".format(", ".join(map(str, duplicates))))
+            db.execute('UPDATE poker_players SET '
+                       'balance=(SELECT SUM(balance) FROM poker_players AS p WHERE p.user_id=poker_players.user_id), '
+                       'win_count=(SELECT SUM(win_count) FROM poker_players AS p WHERE p.user_id=poker_players.user_id), '
+                       'profit=(SELECT SUM(profit) FROM poker_players AS p WHERE p.user_id=poker_players.user_id), '
+                       'next_claim_time=(SELECT MAX(next_claim_time) FROM poker_players AS p WHERE p.user_id=poker_players.user_id) '
+                       'WHERE id IN (SELECT MIN(id) FROM poker_players GROUP BY user_id HAVING COUNT(*) > 1)')
+            db.execute('DELETE FROM poker_players WHERE id NOT IN (SELECT MIN(id) FROM poker_players GROUP BY user_id)')
+        db.execute('CREATE UNIQUE INDEX poker_players_user_id ON poker_players(user_id)')
+
+    # Leaderboard reads accounts in balance order
+    db.execute('CREATE INDEX IF NOT EXISTS poker_players_balance ON poker_players(balance)')
 
-# Initialize db connection
-bot.db = sqlite3.connect('main.db')
-# Create tables for muted members and access roles. Necessary for basic functionality.
-bot.db.execute('CREATE TABLE IF NOT EXISTS mutes (id integer NOT NULL primary key AUTOINCREMENT, member_id varchar, member_name varchar, mute_time integer, server_id varchar)')
-bot.db.execute('CREATE TABLE IF NOT EXISTS roles (id integer NOT NULL primary key AUTOINCREMENT, role_id varchar, role varchar, level int, serverid varchar)')
-bot.db.execute('CREATE TABLE IF NOT EXISTS poker_players (id integer NOT NULL primary key AUTOINCREMENT, user_id varchar, name varchar, balance int, win_count int, next_claim_time integer)')
-bot.db.commit()
 
 # Global storages
 # Roles
@@ -60,7 +76,6 @@ async def on_ready():
     print("{} has started!".format(bot.user.name))
     print("Current time is {}".format(bot.start_time))
 
-    cursor = bot.db.cursor()
     for server in bot.servers:
 
         # Add server to access_roles storage
@@ -71,8 +86,7 @@ async def on_ready():
         bot.servers_settings.update({server.id: {'wiki_lang': 'en'}})
 
         # Preload roles in storage
-        cursor.execute("SELECT * FROM roles WHERE serverid={}".format(server.id))
-        roles_data = cursor.fetchall()
+        roles_data = await bot.db.fetchall("SELECT * FROM roles WHERE serverid=?", (server.id,))
         if roles_data:
             for row in roles_data:
                 # row[0] - ID
@@ -83,8 +97,6 @@ async def on_ready():
 
         print("Connected to {} with {:,} members!".format(server.name, server.member_count))
 
-    cursor.close()
-
     # Load extensions after we have connected to servers
     print("Loading addons:")
     for extension in bot.config['extensions']:
@@ -95,8 +107,24 @@ async def on_ready():
 
     await bot.change_presence(game=discord.Game(name='Kurisu, help | El.Psy.Kongroo'))
 
-# Set bot type in config. Will use token by default.
-if bot.config['type'] == "user":
-    bot.run(bot.config['user_token'], bot=False)
-else:
-    bot.run(bot.config['token'])
+# Worker processes of poker equity import this file too, they mustn't start the bot
+if __name__ == "__main__":
+
+    # Read config
+    if not os.path.isfile("config.json"):
+        sys.exit("Set up your config.json file first!")
+
+    with open('config.json') as data:
+        bot.config = json.load(data)
+
+    # Initialize db gateway
+    bot.db = Database('main.db')
+
+    # Event loop isn't running yet, so it's fine to wait here
+    bot.db.submit(create_tables).result()
+
+    # Set bot type in config. Will use token by default.
+    if bot.config['type'] == "user":
+        bot.run(bot.config['user_token'], bot=False)
+    else:
+        bot.run(bot.config['token'])
@@ -0,0 +1,31 @@
+from random import Random
+
+from addons.deuces import Evaluator
+from addons.deuces.deck import Deck
+
+
+def random_hands(size, count, seed):
+    rng = Random(seed)
+    return [rng.sample(Deck.FULL_DECK, size) for _ in range(count)]
+
+
+def test_direct_engine_matches_combinations():
+    combinations = Evaluator(Evaluator.COMBINATIONS)
+    direct = Evaluator(Evaluator.DIRECT)
+
+    for size in (5, 6, 7):
+        for hand in random_hands(size, 20000, seed=size):
+            assert direct.evaluate(hand[:2], hand[2:]) == combinations.evaluate(hand[:2], hand[2:]), hand
+
+
+def test_hand_state_matches_combinations():
+    combinations = Evaluator(Evaluator.COMBINATIONS)
+    direct = Evaluator(Evaluator.DIRECT)
+
+    for i, hand in enumerate(random_hands(7, 20000, seed=0)):
+        # Board of 0 to 5 cards, the rest is added on top of it
+        state = direct.hand_state(hand[:i % 6])
+        rank = combinations.evaluate(hand[:2], hand[2:])
+
+        assert state.peek(hand[i % 6:]) == rank, hand
+        assert state.add(hand[i % 6:]) == rank, hand
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("discord")
+
+from addons.database import Database
+from addons.poker import DBFunctions
+
+
+def create_tables(db):
+    db.execute('CREATE TABLE poker_players (id integer NOT NULL primary key AUTOINCREMENT, user_id varchar, name varchar, balance int, win_count int, next_claim_time integer, profit integer DEFAULT 0)')
+    db.execute('CREATE TABLE poker_journal (id integer NOT NULL primary key, last_seq integer)')
+    db.execute("INSERT INTO poker_players(user_id, name, balance, win_count, profit) VALUES ('1', 'player', 5000, 0, 0)")
+
+
+def balance(db):
+    return db.submit(lambda connection: connection.execute("SELECT balance FROM poker_players WHERE user_id='1'").fetchone()[0]).result()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "main.db"))
+    db.submit(create_tables).result()
+    yield db
+    db.close()
+
+
+def test_failed_write_is_not_replayed(db, tmp_path):
+    journal_path = str(tmp_path / "poker_journal.log")
+    db_funcs = DBFunctions(db, journal_path)
+
+    db.submit(db_funcs.write_journaled, [("player", 6000, "1")], [(1, 1000, "1")]).result()
+
+    # Journal table is missing, so the transaction fails after the entry is appended
+    db.submit(lambda connection: connection.execute("ALTER TABLE poker_journal RENAME TO poker_journal_old")).result()
+    with pytest.raises(sqlite3.Error):
+        db.submit(db_funcs.write_journaled, [("player", 7000, "1")], []).result()
+    db.submit(lambda connection: connection.execute("ALTER TABLE poker_journal_old RENAME TO poker_journal")).result()
+
+    assert balance(db) == 6000
+
+    # Written outside the journal, like a daily claim
+    db.submit(lambda connection: connection.execute("UPDATE poker_players SET balance=9000 WHERE user_id='1'")).result()
+
+    assert [seq for seq, _, _ in db_funcs.journal.entries()] == [1]
+
+    # Restart replays the journal
+    db_funcs.journal.file.close()
+    db_funcs = DBFunctions(db, journal_path)
+
+    assert balance(db) == 9000
+
+    db.submit(db_funcs.write_journaled, [("player", 8000, "1")], []).result()
+
+    # Committed entries were compacted on startup
+    assert [seq for seq, _, _ in db_funcs.journal.entries()] == [2]
+    assert balance(db) == 8000
+
+
+def test_failed_replay_keeps_entries(db, tmp_path):
+    journal_path = str(tmp_path / "poker_journal.log")
+
+    # Entry which didn't make it to database before a crash
+    db_funcs = DBFunctions(db, journal_path)
+    db_funcs.replay.result()
+    db.submit(lambda connection: None).result()
+    db_funcs.journal.append(1, [("player", 6000, "1")], [(1, 1000, "1")])
+    db_funcs.journal.close()
+
+    # Journal table is missing, so replay on startup fails
+    db.submit(lambda connection: connection.execute("ALTER TABLE poker_journal RENAME TO poker_journal_old")).result()
+    db_funcs = DBFunctions(db, journal_path)
+    with pytest.raises(sqlite3.Error):
+        db_funcs.replay.result()
+    with pytest.raises(sqlite3.Error):
+        db.submit(db_funcs.write_journaled, [("player", 7000, "1")], []).result()
+    db.submit(lambda connection: connection.execute("ALTER TABLE poker_journal_old RENAME TO poker_journal")).result()
+
+    assert balance(db) == 5000
+    assert [seq for seq, _, _ in db_funcs.journal.entries()] == [1]
+
+    # Next write replays the entry first and is numbered after it
+    db.submit(db_funcs.write_journaled, [("player", 8000, "1")], []).result()
+
+    assert [seq for seq, _, _ in db_funcs.journal.entries()] == [1, 2]
+    assert balance(db) == 8000
+    assert db.submit(lambda connection: connection.execute("SELECT win_count FROM poker_players WHERE user_id='1'").fetchone()[0]).result() == 1
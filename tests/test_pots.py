@@ -0,0 +1,29 @@
+from addons import fuzz
+from addons import holdem
+
+
+def test_layers_of_same_players_make_one_pot():
+    # Folded player's stake splits the stakes of the other two into two layers
+    stakes = [(0, 100, 2), (1, 60, None), (2, 100, 1)]
+    pots, returned = holdem.resolve_pots(stakes)
+
+    assert returned is None
+    assert [(pot.amount, pot.players, pot.shares) for pot in pots] == [(260, [0, 2], [(2, 260)])]
+
+
+def test_merged_pot_is_split_once():
+    # Split layer by layer, first winners would get an odd chip of each one
+    stakes = [(0, 3, 1), (1, 3, 1), (2, 3, 1), (3, 1, None), (4, 2, None)]
+    pots, _ = holdem.resolve_pots(stakes)
+
+    assert [pot.shares for pot in pots] == [[(0, 4), (1, 4), (2, 4)]]
+
+
+def test_random_pots():
+    result = fuzz.check_pots(5000, seed=0)
+    assert result["passed"], result["failures"]
+
+
+def test_random_hands():
+    result = fuzz.check_hands(500, seed=0)
+    assert result["passed"], result